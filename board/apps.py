@@ -3,3 +3,13 @@ from django.apps import AppConfig
 
 class BoardConfig(AppConfig):
     name = 'board'
+
+    def ready(self):
+        from django.core.signals import request_finished, request_started
+        from django.db.backends.signals import connection_created
+
+        from . import db, signals  # noqa: F401
+
+        request_started.connect(db.check_connections)
+        request_finished.connect(db.mark_connections)
+        connection_created.connect(db.count_connection)
@@ -0,0 +1,169 @@
+import copy
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.utils.crypto import salted_hmac
+
+from rest_framework import authentication
+
+from .cache import LRUCache
+
+User = get_user_model()
+
+credentials_cache = LRUCache(
+    maxsize=settings.BOARD_AUTH_CACHE_SIZE, ttl=settings.BOARD_AUTH_CACHE_TTL)
+
+
+def copy_user(user):
+    """Copy of a user instance with its own state and cached relations."""
+    user = copy.copy(user)
+    user._state = copy.copy(user._state)
+    user._state.fields_cache = {}
+    return user
+
+
+def credentials_digest(userid, password):
+    """Keyed digest of a username and password, the cache never holds them."""
+    value = f'{userid}\0{password}'
+    return salted_hmac('board.authentication.credentials_digest', value).hexdigest()
+
+
+def forget_credentials(pk):
+    """Forget the verified credentials of a user."""
+    for key, (user_pk, password_hash) in credentials_cache.items():
+        if user_pk == pk:
+            credentials_cache.pop(key)
+
+
+class CachedBasicAuthentication(authentication.BasicAuthentication):
+    """
+    BasicAuthentication remembering successful verifications for a short time.
+
+    Verifying a password runs the full password hasher, which dominates small
+    requests. Verified credentials are remembered for BOARD_AUTH_CACHE_TTL
+    seconds with the password hash they matched. A hit still loads the user
+    and is rejected if it was deactivated or its password hash changed since.
+    """
+
+    def authenticate_credentials(self, userid, password, request=None):
+        key = credentials_digest(userid, password)
+        cached = credentials_cache.get(key)
+        if cached is not None:
+            pk, password_hash = cached
+            user = User._default_manager.filter(pk=pk).first()
+            if user is not None and user.is_active and user.password == password_hash:
+                return (user, None)
+            credentials_cache.pop(key)
+        user, auth = super().authenticate_credentials(userid, password, request)
+        credentials_cache.set(key, (user.pk, user.password))
+        return (user, auth)
+
+
+class TokenCache(object):
+    """
+    Users of resolved tokens in a per-process LRU and, by primary key,
+    optionally in the shared ``BOARD_TOKEN_CACHE`` cache.
+
+    Entries are keyed by a digest of the token key and forgotten through
+    signals when the token or its user is saved or deleted. Signals only
+    reach the local tier of the process that made the change, so local
+    entries expire after BOARD_TOKEN_CACHE_LOCAL_TTL seconds and other
+    processes notice a changed user or a deleted token within that time.
+    Shared entries are deleted by the token signals, last
+    BOARD_TOKEN_CACHE_TTL seconds and only save the token lookup, the user
+    is loaded again.
+    """
+
+    prefix = 'board:token:'
+
+    def __init__(self, maxsize, ttl, local_ttl):
+        self.ttl = ttl
+        self.local = LRUCache(maxsize=maxsize, ttl=local_ttl)
+        self.shared_hits = 0
+        self.shared_misses = 0
+
+    @property
+    def shared(self):
+        alias = settings.BOARD_TOKEN_CACHE
+        return caches[alias] if alias else None
+
+    def get_key(self, key):
+        return salted_hmac('board.authentication.TokenCache', key).hexdigest()
+
+    def get_user(self, key):
+        """A copy of the user of a token, requests never share an instance."""
+        user = self.local.get(self.get_key(key))
+        return copy_user(user) if user is not None else None
+
+    def get_pk(self, key):
+        """Primary key of the user of a token, from the shared tier."""
+        if self.shared is None:
+            return None
+        pk = self.shared.get(self.prefix + self.get_key(key))
+        if pk is None:
+            self.shared_misses += 1
+        else:
+            self.shared_hits += 1
+        return pk
+
+    def set(self, key, user, shared=True):
+        digest = self.get_key(key)
+        self.local.set(digest, copy_user(user))
+        if shared and self.shared is not None:
+            self.shared.set(self.prefix + digest, user.pk, self.ttl)
+
+    def forget(self, *keys):
+        digests = [self.get_key(key) for key in keys]
+        for digest in digests:
+            self.local.pop(digest)
+        if self.shared is not None:
+            self.shared.delete_many([self.prefix + digest for digest in digests])
+
+    def forget_user(self, pk):
+        """Forget the local copies of a user, shared entries only hold its primary key."""
+        for digest, user in self.local.items():
+            if user.pk == pk:
+                self.local.pop(digest)
+
+    def clear(self):
+        self.local.clear()
+
+    def stats(self):
+        result = self.local.stats()
+        result['shared_hits'] = self.shared_hits
+        result['shared_misses'] = self.shared_misses
+        lookups = result['hits'] + result['misses']
+        result['hit_rate'] = result['hits'] / lookups if lookups else None
+        return result
+
+
+token_cache = TokenCache(
+    maxsize=settings.BOARD_TOKEN_CACHE_SIZE, ttl=settings.BOARD_TOKEN_CACHE_TTL,
+    local_ttl=settings.BOARD_TOKEN_CACHE_LOCAL_TTL)
+
+
+class CachedTokenAuthentication(authentication.TokenAuthentication):
+    """
+    TokenAuthentication remembering which user a token belongs to.
+
+    A local hit costs no query. A shared hit loads the user by primary key
+    instead of joining the token table and is rejected if the user was
+    deactivated since. ``request.auth`` is then an unsaved Token holding the
+    key and the user.
+    """
+
+    def authenticate_credentials(self, key):
+        user = token_cache.get_user(key)
+        if user is not None:
+            return (user, self.get_model()(key=key, user=user))
+        pk = token_cache.get_pk(key)
+        if pk is not None:
+            user = User._default_manager.filter(pk=pk).first()
+            if user is not None and user.is_active:
+                token_cache.set(key, user, shared=False)
+                return (user, self.get_model()(key=key, user=user))
+            token_cache.forget(key)
+        user, token = super().authenticate_credentials(key)
+        token_cache.set(key, user)
+        return (user, token)
@@ -0,0 +1,76 @@
+import random
+import statistics
+import time
+
+from datetime import date, timedelta
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+
+from .models import Sprint, Task
+
+User = get_user_model()
+
+PREFIX = 'bench-'
+
+# Vocabulary of the seeded task descriptions
+WORDS = (
+    'api', 'backend', 'billing', 'browser', 'cache', 'checkout', 'cleanup', 'config', 'crash',
+    'database', 'deploy', 'design', 'docs', 'email', 'export', 'feature', 'fix', 'frontend',
+    'import', 'invoice', 'layout', 'login', 'logging', 'migration', 'mobile', 'monitoring',
+    'password', 'payment', 'performance', 'profile', 'refactor', 'release', 'report', 'search',
+    'security', 'signup', 'sprint', 'styles', 'timeout', 'upgrade', 'upload', 'websocket',
+)
+
+
+def seed(sprints, tasks, users=20, batch_size=1000):
+    """
+    Create benchmark sprints, users and tasks, a tenth of the tasks are in the backlog.
+
+    Every object is named with PREFIX so ``clear`` can remove them afterwards.
+    """
+    start = date.today() - timedelta(days=sprints // 2)
+    words = random.Random(0)
+    with transaction.atomic():
+        User.objects.bulk_create([
+            User(**{User.USERNAME_FIELD: f'{PREFIX}{i}'}) for i in range(users)
+        ])
+        Sprint.objects.bulk_create([
+            Sprint(name=f'{PREFIX}{i}', end=start + timedelta(days=i)) for i in range(sprints)
+        ])
+        user_ids = list(User.objects.filter(
+            **{f'{User.USERNAME_FIELD}__startswith': PREFIX}).values_list('pk', flat=True))
+        sprint_ids = list(Sprint.objects.filter(name__startswith=PREFIX).values_list('pk', flat=True))
+        for offset in range(0, tasks, batch_size):
+            batch = []
+            for i in range(offset, min(offset + batch_size, tasks)):
+                sprint = None if i % 10 == 0 else sprint_ids[i % len(sprint_ids)]
+                batch.append(Task(
+                    name=f'{PREFIX}{i}',
+                    description=f"Benchmark task {i} {' '.join(words.sample(WORDS, 6))}",
+                    sprint_id=sprint,
+                    status=Task.STATUS_TODO if sprint is None else i % 4 + 1,
+                    order=i % 100,
+                    due=start + timedelta(days=i % sprints) if i % 3 else None,
+                    assigned_id=user_ids[i % len(user_ids)] if i % 5 else None,
+                ))
+            Task.objects.bulk_create(batch)
+
+
+def clear():
+    """Remove everything created by ``seed``."""
+    with transaction.atomic():
+        Task.objects.filter(name__startswith=PREFIX).delete()
+        Sprint.objects.filter(name__startswith=PREFIX).delete()
+        User.objects.filter(**{f'{User.USERNAME_FIELD}__startswith': PREFIX}).delete()
+
+
+def measure(func, repeat):
+    """Run ``func`` ``repeat`` times, returns the median and p95 in milliseconds."""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return statistics.median(timings), timings[min(len(timings) - 1, int(len(timings) * 0.95))]
@@ -0,0 +1,193 @@
+import hashlib
+import math
+import threading
+import time
+
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache, caches
+
+
+class LRUCache(object):
+    """
+    Thread-safe mapping keeping at most ``maxsize`` recently used entries.
+
+    Entries optionally expire ``ttl`` seconds after they were set.
+    """
+
+    def __init__(self, maxsize=1024, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value, expires = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            if expires is not None and expires <= time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        expires = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def items(self):
+        """Snapshot of the entries, expired ones included."""
+        with self._lock:
+            return [(key, value) for key, (value, expires) in self._data.items()]
+
+    def pop(self, key, default=None):
+        with self._lock:
+            value = self._data.pop(key, None)
+        return default if value is None else value[0]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        return {
+            'size': len(self._data),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+
+VERSION_KEY = 'board:version:{}'
+
+
+def get_versions(*names):
+    """
+    Return the version stamps of the given collections.
+
+    A stamp is the time in whole seconds of the last write to the collection,
+    or later when there were several writes in a second. They live in the
+    default cache, which must be shared when running several processes.
+    """
+    keys = [VERSION_KEY.format(name) for name in names]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            # Unknown or evicted, anything cached by clients is now stale.
+            now = math.ceil(time.time())
+            cache.add(key, now, None)
+            found[key] = cache.get(key, now)
+    return [found[key] for key in keys]
+
+
+def bump_versions(*names):
+    """
+    Mark the given collections as changed.
+
+    Stamps are incremented atomically, so each write gets a strictly greater
+    stamp even within the same second, then catch up with the clock.
+    """
+    now = math.ceil(time.time())
+    for name in names:
+        key = VERSION_KEY.format(name)
+        try:
+            version = cache.incr(key)
+        except ValueError:
+            if cache.add(key, now, None):
+                continue
+            version = cache.incr(key)
+        if version < now:
+            cache.incr(key, now - version)
+
+
+class ResponseCache(object):
+    """
+    Cache of list response data split in invalidation scopes.
+
+    Entries are keyed by the version stamps of their scope and ``depends``
+    collections plus the normalized query parameters, invalidating a scope
+    bumps its stamp so only the entries of that scope go stale. Entries are
+    stored in the ``BOARD_RESPONSE_CACHE`` cache whose size bounds memory.
+    Misses of entries this process stored and which had not expired yet are
+    counted as evictions, a cache too small for the lists shows there.
+    """
+
+    def __init__(self, prefix, depends=(), tracked=10000):
+        self.prefix = prefix
+        self.depends = depends
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        # Keys stored by this process, until they expire
+        self.stored = LRUCache(maxsize=tracked)
+
+    @property
+    def cache(self):
+        return caches[settings.BOARD_RESPONSE_CACHE]
+
+    def get_key(self, scope, request):
+        versions = get_versions(f'{self.prefix}:{scope}', *self.depends)
+        params = sorted(
+            (name, value) for name in request.query_params
+            for value in request.query_params.getlist(name)
+        )
+        key = repr((versions, request.get_host(), request.accepted_media_type, params))
+        digest = hashlib.md5(key.encode('utf-8')).hexdigest()
+        return f'board:{self.prefix}:{scope}:{digest}'
+
+    def get(self, key):
+        data = self.cache.get(key)
+        if data is None:
+            self.misses += 1
+            if self.stored.pop(key) is not None:
+                self.evictions += 1
+        else:
+            self.hits += 1
+        return data
+
+    def set(self, key, data):
+        self.cache.set(key, data)
+        self.stored.set(key, True, ttl=self.cache.default_timeout)
+
+    def invalidate(self, *scopes):
+        self.invalidations += len(scopes)
+        bump_versions(*(f'{self.prefix}:{scope}' for scope in scopes))
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations,
+        }
+
+
+task_list_cache = ResponseCache('task-list', depends=('user',))
+
+
+def task_list_scope(sprint_id):
+    return 'backlog' if sprint_id is None else f'sprint:{sprint_id}'
+
+
+def invalidate_task_lists(*sprint_ids):
+    """Invalidate cached task lists of the given sprints (None for the backlog)."""
+    task_list_cache.invalidate('all', *{task_list_scope(sprint_id) for sprint_id in sprint_ids})
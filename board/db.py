@@ -0,0 +1,120 @@
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+_counters = dict.fromkeys(('connects', 'reused', 'unusable'), 0)
+_lock = threading.Lock()
+
+
+def _count(name):
+    with _lock:
+        _counters[name] += 1
+
+
+def stats():
+    with _lock:
+        return dict(_counters)
+
+
+def check_connections(**kwargs):
+    """
+    Close persistent connections the server dropped, before the request uses them.
+
+    Connected to request_started after Django's close_old_connections, which
+    only checks connections that saw an error or outlived CONN_MAX_AGE.
+    Only connections idle for BOARD_DB_HEALTH_CHECK_IDLE seconds are pinged,
+    so back to back requests cost no extra round trip. Connections are per
+    thread, every thread of a threaded server or WSGI worker checks its own.
+    """
+    if not settings.BOARD_DB_HEALTH_CHECKS:
+        return
+    now = time.monotonic()
+    for conn in connections.all():
+        if conn.connection is None:
+            continue
+        if now - getattr(conn, 'board_last_used', 0) < settings.BOARD_DB_HEALTH_CHECK_IDLE:
+            continue
+        if conn.is_usable():
+            _count('reused')
+        else:
+            _count('unusable')
+            logger.info('Closing unusable database connection %s.', conn.alias)
+            conn.close()
+
+
+def mark_connections(**kwargs):
+    """Record when the connections were last used, connected to request_finished."""
+    now = time.monotonic()
+    for conn in connections.all():
+        if conn.connection is not None:
+            conn.board_last_used = now
+
+
+def count_connection(sender, connection, **kwargs):
+    _count('connects')
+
+
+# Connections inherited from the parent process, never closed in this one
+_inherited = []
+
+
+def discard_connections():
+    """
+    Forget the connections inherited from the parent in a forked worker.
+
+    Closing them, or letting them be garbage collected, would end the
+    session of the parent on the shared socket. They are kept referenced and
+    the worker opens its own on first use.
+    """
+    for conn in connections.all():
+        if conn.connection is not None:
+            _inherited.append(conn.connection)
+            conn.connection = None
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=discard_connections)
+
+
+class DatabaseTimingMiddleware(object):
+    """
+    Report the database connection setup and query time of each request.
+
+    The default connection is opened, if needed, before the view runs so its
+    setup is timed apart from the queries. Both are sent in a Server-Timing
+    header and logged at debug level. Enabled by BOARD_DB_TIMING.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        conn = connections['default']
+        started = time.perf_counter()
+        conn.ensure_connection()
+        connect = time.perf_counter() - started
+        timings = {'query': 0.0, 'count': 0}
+
+        def timed(execute, sql, params, many, context):
+            started = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                timings['query'] += time.perf_counter() - started
+                timings['count'] += 1
+
+        with conn.execute_wrapper(timed):
+            response = self.get_response(request)
+        response['Server-Timing'] = (
+            f"db-connect;dur={connect * 1000:.2f}, "
+            f"db-query;dur={timings['query'] * 1000:.2f};desc=\"{timings['count']} queries\""
+        )
+        logger.debug('%s %s: connect %.2fms, %d queries %.2fms', request.method, request.path,
+                     connect * 1000, timings['count'], timings['query'] * 1000)
+        return response
@@ -0,0 +1,335 @@
+import atexit
+import hashlib
+import logging
+import os
+import queue
+import threading
+import time
+
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from django.conf import settings
+from django.core.signing import TimestampSigner
+
+logger = logging.getLogger(__name__)
+
+
+def build_hook_url(path):
+    proto = 'https' if settings.WATERCOOLER_SECURE else 'http'
+    host = settings.WATERCOOLER_SERVER
+    return f"{proto}://{host}/{path}"
+
+
+def build_hook_signature(method, url, body):
+    signer = TimestampSigner(settings.WATERCOOLER_SECRET)
+    body = hashlib.sha256(body or b'').hexdigest()
+    value = f"{method.lower()}:{url}:{body}"
+    return signer.sign(value)
+
+
+class CircuitOpenError(Exception):
+    """The websocket server failed too often and is not being called."""
+
+
+class CircuitBreaker(object):
+    """
+    Stop calling a failing server for a cooldown period.
+
+    After ``threshold`` consecutive failures the circuit opens and every call
+    is rejected until ``cooldown`` seconds have passed. A single trial call is
+    then let through: success closes the circuit, failure opens it again.
+    """
+
+    def __init__(self, threshold=5, cooldown=30.0):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened is None:
+            return 'closed'
+        if time.monotonic() - self.opened < self.cooldown:
+            return 'open'
+        return 'half-open'
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half-open' and not self._trial:
+                self._trial = True
+                return True
+            return False
+
+    def success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened = None
+            self._trial = False
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial or self.failures >= self.threshold:
+                if self.opened is None or self._trial:
+                    logger.warning('Websocket server unavailable, pausing hooks for %ss.', self.cooldown)
+                self.opened = time.monotonic()
+                self._trial = False
+
+
+class HookTransport(object):
+    """
+    Keep-alive HTTP transport to the websocket server.
+
+    A single ``requests.Session`` is used by the dispatcher's sender so
+    connections are reused instead of paying a TCP (and TLS) handshake per
+    hook. Idempotent PUT and DELETE requests are retried with backoff and a
+    circuit breaker skips delivery while the server keeps failing.
+    """
+
+    def __init__(self, pool_size=2, timeout=0.5, retries=2, backoff=0.1,
+                 failure_threshold=5, cooldown=30.0):
+        self.timeout = timeout
+        self.breaker = CircuitBreaker(failure_threshold, cooldown)
+        retry = Retry(
+            total=retries, connect=retries, read=retries, status=retries,
+            backoff_factor=backoff, status_forcelist=(502, 503, 504),
+            method_whitelist=frozenset(['PUT', 'DELETE']), raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def send(self, method, url, body, headers):
+        if not self.breaker.allow():
+            raise CircuitOpenError(url)
+        try:
+            response = self.session.request(method, url, data=body, headers=headers, timeout=self.timeout)
+            response.raise_for_status()
+        except requests.exceptions.HTTPError as e:
+            # The server answered, only 5XX responses count against it
+            if e.response.status_code >= 500:
+                self.breaker.failure()
+            else:
+                self.breaker.success()
+            raise
+        except requests.exceptions.RequestException:
+            # Connection refused or timed out
+            self.breaker.failure()
+            raise
+        self.breaker.success()
+        return response
+
+    def close(self):
+        self.session.close()
+
+
+class HookEvent(object):
+    """
+    A single model change waiting to be sent to the websocket server.
+
+    ``sprints`` lists the sprints whose boards show the object before and
+    after the change, None standing for the backlog. The websocket server
+    uses it to publish the event on those sprint channels only.
+    """
+
+    __slots__ = ('model', 'pk', 'action', 'body', 'sprints', 'queued')
+
+    def __init__(self, model, pk, action, body=None, sprints=None):
+        self.model = model
+        self.pk = pk
+        self.action = action
+        self.body = body
+        self.sprints = sprints
+        self.queued = time.monotonic()
+
+    @property
+    def key(self):
+        return self.model, self.pk
+
+    def merge(self, newer):
+        """Fold a newer event for the same object into this one."""
+        if self.action == 'add' and newer.action == 'update':
+            # Clients have not seen the object yet, keep announcing it as new.
+            self.body = newer.body
+        else:
+            self.action = newer.action
+            self.body = newer.body
+        if self.sprints is not None and newer.sprints is not None:
+            self.sprints = list(dict.fromkeys(self.sprints + newer.sprints))
+        else:
+            self.sprints = None
+
+    def encode(self):
+        body = self.body if self.body is not None else b'null'
+        head = f'{{"model":"{self.model}","id":"{self.pk}","action":"{self.action}",'
+        if self.sprints is not None:
+            head += '"sprints":[%s],' % ','.join('null' if pk is None else str(pk) for pk in self.sprints)
+        return head.encode('utf-8') + b'"body":' + body + b'}'
+
+
+class HookDispatcher(object):
+    """
+    Queue update hooks in-process and send them from a background sender.
+
+    Events for the same ``model/pk`` collected within ``window`` seconds are
+    coalesced and delivered together as one request to the ``/batch``
+    endpoint of the websocket server. Batches are sent one at a time in the
+    order they were collected, a batch is only sent once the previous one
+    was delivered or given up, so a newer state never arrives first. Replaying
+    a batch is then harmless as every event carries the full state of its
+    object, so it is sent as an idempotent PUT which the transport may retry.
+    """
+
+    path = 'batch'
+    method = 'PUT'
+
+    def __init__(self, transport=None, max_queue=1000, window=0.05, max_batch=100):
+        self.transport = transport or HookTransport(pool_size=1)
+        self.window = window
+        self.max_batch = max_batch
+        self._queue = queue.Queue(maxsize=max_queue)
+        # A single sender keeps the batches in order
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._latencies = deque(maxlen=1000)
+        self._counters = dict.fromkeys(
+            ('queued', 'dropped', 'coalesced', 'batches', 'sent', 'failed', 'skipped'), 0)
+        self._collector = threading.Thread(target=self._collect, name='hook-collector', daemon=True)
+        self._collector.start()
+
+    def submit(self, model, pk, action, body=None, sprints=None):
+        """Queue an event without blocking, returns False when it was dropped."""
+        try:
+            self._queue.put_nowait(HookEvent(model, pk, action, body, sprints))
+        except queue.Full:
+            self._count('dropped')
+            logger.warning('Hook queue is full, dropped %s %s/%s.', action, model, pk)
+            return False
+        self._count('queued')
+        return True
+
+    def stats(self):
+        with self._lock:
+            result = dict(self._counters)
+            result['in_flight'] = self._in_flight
+            latencies = sorted(self._latencies)
+        result['depth'] = self._queue.qsize()
+        result['circuit'] = self.transport.breaker.state
+        if latencies:
+            result['latency_p50'] = latencies[len(latencies) // 2]
+            result['latency_p99'] = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+            result['latency_max'] = latencies[-1]
+        return result
+
+    def close(self, timeout=2.0):
+        """Flush queued events and stop the worker pool."""
+        self._queue.put(None)
+        self._collector.join(timeout)
+        self._executor.shutdown(wait=True)
+        self.transport.close()
+
+    def _count(self, name, value=1):
+        with self._lock:
+            self._counters[name] += value
+
+    def _collect(self):
+        while True:
+            event = self._queue.get()
+            if event is None:
+                return
+            batch = OrderedDict([(event.key, event)])
+            deadline = time.monotonic() + self.window
+            closing = False
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    event = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if event is None:
+                    closing = True
+                    break
+                if event.key in batch:
+                    batch[event.key].merge(event)
+                    self._count('coalesced')
+                else:
+                    batch[event.key] = event
+            with self._lock:
+                self._in_flight += 1
+            try:
+                self._executor.submit(self._deliver, list(batch.values()))
+            except RuntimeError:
+                # The interpreter is shutting down, deliver from this thread.
+                self._deliver(list(batch.values()))
+            if closing:
+                return
+
+    def _deliver(self, events):
+        body = b'[' + b','.join(event.encode() for event in events) + b']'
+        url = build_hook_url(self.path)
+        headers = {
+            'content-type': 'application/json',
+            'X-Signature': build_hook_signature(self.method, url, body),
+        }
+        try:
+            self.transport.send(self.method, url, body, headers)
+        except CircuitOpenError:
+            self._count('skipped', len(events))
+        except requests.exceptions.RequestException:
+            self._count('failed', len(events))
+        else:
+            self._count('sent', len(events))
+        finally:
+            now = time.monotonic()
+            with self._lock:
+                self._in_flight -= 1
+                self._counters['batches'] += 1
+                self._latencies.extend(now - event.queued for event in events)
+
+
+_dispatcher = None
+_dispatcher_pid = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_dispatcher():
+    """Return the hook dispatcher of the current process, starting it on first use."""
+    global _dispatcher, _dispatcher_pid
+    pid = os.getpid()
+    if _dispatcher is None or _dispatcher_pid != pid:
+        with _dispatcher_lock:
+            # Threads do not survive a fork, so every worker process gets its own.
+            if _dispatcher is None or _dispatcher_pid != pid:
+                transport = HookTransport(
+                    pool_size=settings.WATERCOOLER_HOOK_POOL_SIZE,
+                    timeout=settings.WATERCOOLER_HOOK_TIMEOUT,
+                    retries=settings.WATERCOOLER_HOOK_RETRIES,
+                    backoff=settings.WATERCOOLER_HOOK_BACKOFF,
+                    failure_threshold=settings.WATERCOOLER_HOOK_FAILURE_THRESHOLD,
+                    cooldown=settings.WATERCOOLER_HOOK_COOLDOWN,
+                )
+                _dispatcher = HookDispatcher(
+                    transport=transport,
+                    max_queue=settings.WATERCOOLER_HOOK_QUEUE_SIZE,
+                    window=settings.WATERCOOLER_HOOK_BATCH_WINDOW,
+                    max_batch=settings.WATERCOOLER_HOOK_BATCH_SIZE,
+                )
+                _dispatcher_pid = pid
+                atexit.register(_dispatcher.close)
+    return _dispatcher
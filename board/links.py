@@ -0,0 +1,101 @@
+import re
+import time
+
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.signing import TimestampSigner
+from django.utils import baseconv
+from django.utils.http import RFC3986_SUBDELIMS
+
+from rest_framework.reverse import reverse
+
+from .cache import LRUCache
+
+
+class LinkBuilder(object):
+    """
+    Build absolute API links for a single request.
+
+    Each route is reversed once with a placeholder argument, the links of
+    every object are then formatted by substituting the placeholder. The
+    result is the same as calling ``rest_framework.reverse.reverse``.
+    """
+
+    placeholder = 'linkbuilderarg'
+    # Default lookup_value_regex of the router, other values go through reverse()
+    segment = re.compile(r'[^/.]+\Z')
+    # Characters django.urls.reverse() leaves unquoted
+    safe = RFC3986_SUBDELIMS + '/~:@'
+
+    def __init__(self, request):
+        self.request = request
+        self._templates = {}
+
+    def url(self, viewname, **kwargs):
+        if not kwargs:
+            key = (viewname, None)
+            if key not in self._templates:
+                self._templates[key] = reverse(viewname, request=self.request)
+            return self._templates[key]
+        (name, value), = kwargs.items()
+        value = str(value)
+        key = (viewname, name)
+        template = self._templates.get(key)
+        if template is None:
+            url = reverse(viewname, kwargs={name: self.placeholder}, request=self.request)
+            template = self._templates[key] = tuple(url.split(self.placeholder))
+        if len(template) != 2 or not self.segment.match(value):
+            return reverse(viewname, kwargs={name: value}, request=self.request)
+        prefix, suffix = template
+        return prefix + quote(value, safe=self.safe) + suffix
+
+
+def get_link_builder(request):
+    """Return the link builder shared by all serializers of a request."""
+    builder = getattr(request, '_link_builder', None)
+    if builder is None:
+        builder = LinkBuilder(request)
+        setattr(request, '_link_builder', builder)
+    return builder
+
+
+class BucketTimestampSigner(TimestampSigner):
+    """Timestamp signer stamping values with the start of a time bucket."""
+
+    def __init__(self, key=None, sep=':', salt=None, *, bucket):
+        # Keep the default salt of TimestampSigner so watercooler can unsign it.
+        salt = salt or '%s.%s' % (TimestampSigner.__module__, TimestampSigner.__name__)
+        super().__init__(key, sep=sep, salt=salt)
+        self.bucket = bucket
+
+    def timestamp(self):
+        return baseconv.base62.encode(self.bucket)
+
+
+_channels = LRUCache(maxsize=4096)
+
+
+def channel_bucket():
+    """Start of the current refresh period of signed channels."""
+    refresh = settings.WATERCOOLER_CHANNEL_REFRESH
+    return int(time.time()) // refresh * refresh
+
+
+def sign_channel(pk):
+    """
+    Return the signed websocket channel of a sprint.
+
+    Tokens are stamped with the start of the current refresh period instead of
+    the current time, so the same token is reused by every request and process
+    until the period ends. The period is kept well below the 30 minutes
+    max_age enforced by ``watercooler.SprintHandler.open``.
+    """
+    bucket = channel_bucket()
+    key = (settings.WATERCOOLER_SECRET, pk, bucket)
+    token = _channels.get(key)
+    if token is None:
+        signer = BucketTimestampSigner(settings.WATERCOOLER_SECRET, bucket=bucket)
+        token = signer.sign(pk)
+        _channels.set(key, token)
+    return token
@@ -0,0 +1,55 @@
+import base64
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.utils.crypto import get_random_string
+
+from rest_framework import authentication
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIRequestFactory
+
+from board import benchmarks
+from board.authentication import (
+    CachedBasicAuthentication, CachedTokenAuthentication, credentials_cache, token_cache,
+)
+from board.views import UserViewSet
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Report the latency and throughput of authenticated API requests for each authentication class.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=200, help='Requests per authentication class.')
+
+    def get_cases(self, user, password):
+        credentials = base64.b64encode(f'{user.get_username()}:{password}'.encode('utf-8')).decode('ascii')
+        basic = f'Basic {credentials}'
+        yield 'BasicAuthentication', authentication.BasicAuthentication, basic
+        yield 'CachedBasicAuthentication', CachedBasicAuthentication, basic
+        token, _ = Token.objects.get_or_create(user=user)
+        yield 'TokenAuthentication', authentication.TokenAuthentication, f'Token {token.key}'
+        yield 'CachedTokenAuthentication', CachedTokenAuthentication, f'Token {token.key}'
+
+    def handle(self, *args, **options):
+        password = get_random_string(16)
+        user = User.objects.create_user(**{User.USERNAME_FIELD: f'{benchmarks.PREFIX}auth', 'password': password})
+        factory = APIRequestFactory(HTTP_HOST='localhost')
+        url = f'/api/users/{user.get_username()}'
+        kwargs = {User.USERNAME_FIELD: user.get_username()}
+        try:
+            self.stdout.write(f"{'authentication':<32}{'p50 ms':>10}{'p95 ms':>10}{'req/s':>10}")
+            for name, cls, header in self.get_cases(user, password):
+                credentials_cache.clear()
+                token_cache.clear()
+                view = UserViewSet.as_view({'get': 'retrieve'}, authentication_classes=(cls,))
+
+                def request():
+                    response = view(factory.get(url, HTTP_AUTHORIZATION=header), **kwargs)
+                    assert response.status_code == 200, response.status_code
+
+                p50, p95 = benchmarks.measure(request, options['repeat'])
+                self.stdout.write(f'{name:<32}{p50:>10.2f}{p95:>10.2f}{1000 / p50:>10.0f}')
+        finally:
+            benchmarks.clear()
@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand
+
+from board import benchmarks
+from board.models import Sprint, Task
+from board.views import SprintFilter, TaskFilter, TaskViewSet
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed sprints and tasks and report the query plans and latencies of the '
+        'board filters. Run it before and after "migrate board" to compare indexes.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sprints', type=int, default=100, help='Number of sprints to seed.')
+        parser.add_argument('--tasks', type=int, default=100000, help='Number of tasks to seed.')
+        parser.add_argument('--repeat', type=int, default=20, help='Runs of each query.')
+        parser.add_argument('--no-seed', action='store_true', help='Reuse previously seeded data.')
+        parser.add_argument('--keep', action='store_true', help='Keep the seeded data.')
+        parser.add_argument('--explain', action='store_true', help='Print the query plans.')
+
+    def get_cases(self):
+        sprint = Sprint.objects.filter(name__startswith=benchmarks.PREFIX).order_by('end')[1]
+        user = Task.objects.filter(sprint=sprint, assigned__isnull=False).values_list(
+            'assigned__username', flat=True).first()
+        tasks = TaskViewSet.queryset
+        cases = [
+            ('tasks?sprint', {'sprint': sprint.pk}, ()),
+            ('tasks?sprint&status', {'sprint': sprint.pk, 'status': Task.STATUS_IN_PROGRESS}, ()),
+            ('tasks?assigned&status', {'assigned': user, 'status': Task.STATUS_IN_PROGRESS}, ()),
+            ('tasks?backlog', {'backlog': 'True'}, ()),
+            ('tasks?sprint&ordering=order', {'sprint': sprint.pk}, ('order', 'id')),
+            ('tasks?sprint&ordering=-due', {'sprint': sprint.pk}, ('-due', 'id')),
+            ('tasks?backlog&ordering=due', {'backlog': 'True'}, ('due', 'id')),
+        ]
+        for name, params, ordering in cases:
+            queryset = TaskFilter(params, queryset=tasks).qs
+            yield name, queryset.order_by(*ordering) if ordering else queryset
+        params = {'end_min': sprint.end, 'end_max': sprint.end.replace(year=sprint.end.year + 1)}
+        yield 'sprints?end_min&end_max', SprintFilter(params, queryset=Sprint.objects.order_by('end')).qs
+
+    def handle(self, *args, **options):
+        if not options['no_seed']:
+            self.stdout.write(f"Seeding {options['sprints']} sprints and {options['tasks']} tasks...")
+            benchmarks.clear()
+            benchmarks.seed(options['sprints'], options['tasks'])
+        try:
+            self.stdout.write(f"{'query':<32}{'page p50':>10}{'page p95':>10}{'count p50':>11}{'count p95':>11}")
+            for name, queryset in self.get_cases():
+                page = benchmarks.measure(lambda: list(queryset[:25]), options['repeat'])
+                count = benchmarks.measure(queryset.count, options['repeat'])
+                self.stdout.write(f'{name:<32}{page[0]:>10.2f}{page[1]:>10.2f}{count[0]:>11.2f}{count[1]:>11.2f}')
+                if options['explain']:
+                    self.stdout.write(queryset[:25].explain())
+        finally:
+            if not options['keep']:
+                benchmarks.clear()
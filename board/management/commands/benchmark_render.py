@@ -0,0 +1,61 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from board import benchmarks
+from board.renderers import FastJSONRenderer, orjson
+from board.views import SprintViewSet, TaskViewSet, UserViewSet
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Report the latency of serializing and rendering a page of each list endpoint, '
+        'with the serializers and with the .values() fast path of ValuesListMixin.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--page-size', type=int, default=100, help='Objects per rendered page.')
+        parser.add_argument('--repeat', type=int, default=200, help='Renders of each page.')
+
+    def get_cases(self):
+        yield 'tasks', TaskViewSet, TaskViewSet.queryset.filter(name__startswith=benchmarks.PREFIX)
+        yield 'sprints', SprintViewSet, SprintViewSet.queryset.filter(name__startswith=benchmarks.PREFIX)
+        yield 'users', UserViewSet, UserViewSet.queryset.filter(
+            **{f'{User.USERNAME_FIELD}__startswith': benchmarks.PREFIX})
+
+    def get_paths(self, serializer_class, queryset, context):
+        def instances():
+            return serializer_class(list(queryset), many=True, context=context).data
+
+        def rows():
+            serializer = serializer_class(context=context)
+            return [serializer.to_row_representation(row) for row in queryset.values(*serializer.values_fields)]
+
+        yield 'serializer + JSONRenderer', lambda: JSONRenderer().render(instances())
+        yield 'values + JSONRenderer', lambda: JSONRenderer().render(rows())
+        yield 'values + FastJSONRenderer', lambda: FastJSONRenderer().render(rows())
+
+    def handle(self, *args, **options):
+        size = options['page_size']
+        benchmarks.clear()
+        benchmarks.seed(sprints=size, tasks=size, users=size)
+        context = {'request': Request(APIRequestFactory(HTTP_HOST='localhost').get('/api/'))}
+        self.stdout.write(f"orjson {'installed' if orjson else 'not installed'}, pages of {size} objects")
+        try:
+            self.stdout.write(f"{'endpoint':<10}{'path':<28}{'p50 ms':>10}{'p95 ms':>10}{'pages/s':>10}")
+            for name, viewset, queryset in self.get_cases():
+                expected = None
+                for path, render in self.get_paths(viewset.serializer_class, queryset[:size], context):
+                    body = render()
+                    expected = expected or body
+                    if body != expected:
+                        self.stderr.write(f'{name}: {path} renders different bytes')
+                    p50, p95 = benchmarks.measure(render, options['repeat'])
+                    self.stdout.write(f'{name:<10}{path:<28}{p50:>10.2f}{p95:>10.2f}{1000 / p50:>10.0f}')
+        finally:
+            benchmarks.clear()
@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from rest_framework import filters
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from board import benchmarks
+from board.search import FullTextSearchFilter
+from board.views import TaskViewSet
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed tasks and report the latency of task searches with SearchFilter and '
+        'FullTextSearchFilter. The FULLTEXT index is only used on MySQL.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sprints', type=int, default=100, help='Number of sprints to seed.')
+        parser.add_argument('--tasks', type=int, default=1000000, help='Number of tasks to seed.')
+        parser.add_argument('--repeat', type=int, default=10, help='Runs of each query.')
+        parser.add_argument('--no-seed', action='store_true', help='Reuse previously seeded data.')
+        parser.add_argument('--keep', action='store_true', help='Keep the seeded data.')
+        parser.add_argument('--explain', action='store_true', help='Print the query plans.')
+
+    def get_queryset(self, backend, search):
+        request = Request(APIRequestFactory().get('/api/tasks', {'search': search}))
+        view = TaskViewSet(request=request, format_kwarg=None, action='list')
+        return backend().filter_queryset(request, TaskViewSet.queryset.all(), view)
+
+    def handle(self, *args, **options):
+        if not options['no_seed']:
+            self.stdout.write(f"Seeding {options['sprints']} sprints and {options['tasks']} tasks...")
+            benchmarks.clear()
+            benchmarks.seed(options['sprints'], options['tasks'])
+        searches = ('websocket', 'pay', 'login timeout', 'cache deploy release')
+        backends = (filters.SearchFilter, FullTextSearchFilter)
+        try:
+            self.stdout.write(f'Database: {connection.vendor}')
+            self.stdout.write(f"{'search':<24}{'backend':<24}{'page p50':>10}{'page p95':>10}"
+                              f"{'count p50':>11}{'count p95':>11}")
+            for search in searches:
+                for backend in backends:
+                    queryset = self.get_queryset(backend, search)
+                    page = benchmarks.measure(lambda: list(queryset[:25]), options['repeat'])
+                    count = benchmarks.measure(queryset.count, options['repeat'])
+                    self.stdout.write(f'{search:<24}{backend.__name__:<24}{page[0]:>10.2f}{page[1]:>10.2f}'
+                                      f'{count[0]:>11.2f}{count[1]:>11.2f}')
+                    if options['explain']:
+                        self.stdout.write(queryset[:25].explain())
+        finally:
+            if not options['keep']:
+                benchmarks.clear()
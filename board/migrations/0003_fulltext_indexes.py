@@ -0,0 +1,36 @@
+from django.db import migrations
+
+# Django has no FULLTEXT index type, they exist on MySQL only and are not
+# part of the model state. board.search.FULLTEXT_INDEXES lists their columns.
+INDEXES = (
+    ('board_task', 'task_fulltext_idx', ('name', 'description')),
+    ('board_sprint', 'sprint_fulltext_idx', ('name',)),
+)
+
+
+def create_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'mysql':
+        return
+    quote = schema_editor.quote_name
+    for table, name, columns in INDEXES:
+        schema_editor.execute(
+            f"CREATE FULLTEXT INDEX {quote(name)} ON {quote(table)} ({', '.join(map(quote, columns))})")
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'mysql':
+        return
+    quote = schema_editor.quote_name
+    for table, name, columns in INDEXES:
+        schema_editor.execute(f'DROP INDEX {quote(name)} ON {quote(table)}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('board', '0002_task_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
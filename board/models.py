@@ -49,3 +49,12 @@ class Task(models.Model):
 
     class Meta:
         ordering = ['id']
+        # Access paths of TaskFilter and the ordering_fields of TaskViewSet,
+        # the backlog (sprint IS NULL) is served by the sprint prefixes.
+        # The FULLTEXT index of the search is created by a migration on MySQL.
+        indexes = [
+            models.Index(fields=['sprint', 'status', 'order'], name='task_sprint_status_order_idx'),
+            models.Index(fields=['sprint', 'order'], name='task_sprint_order_idx'),
+            models.Index(fields=['sprint', 'due'], name='task_sprint_due_idx'),
+            models.Index(fields=['assigned', 'status'], name='task_assigned_status_idx'),
+        ]
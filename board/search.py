@@ -0,0 +1,104 @@
+import re
+
+from django.db import connections
+from django.db.models import Case, FloatField, Func, IntegerField, Q, Value, When
+
+from rest_framework import filters
+from rest_framework.pagination import CursorPagination
+
+from .models import Sprint, Task
+
+# Columns of the FULLTEXT indexes created by the 0003_fulltext_indexes migration,
+# MATCH() must list exactly the columns of an index.
+FULLTEXT_INDEXES = {
+    Task: ('name', 'description'),
+    Sprint: ('name',),
+}
+
+# Operators of the MySQL boolean full-text syntax
+BOOLEAN_OPERATORS = re.compile(r'[+\-<>()~*"@]+')
+
+
+class Match(Func):
+    """``MATCH (columns) AGAINST (query IN BOOLEAN MODE)``, the relevance of a row on MySQL."""
+
+    output_field = FloatField()
+
+    def __init__(self, *fields, query):
+        super().__init__(*fields, Value(query))
+
+    def as_sql(self, compiler, connection, **extra_context):
+        columns, params = [], []
+        for expression in self.source_expressions[:-1]:
+            sql, expression_params = compiler.compile(expression)
+            columns.append(sql)
+            params.extend(expression_params)
+        query, query_params = compiler.compile(self.source_expressions[-1])
+        return f"MATCH ({', '.join(columns)}) AGAINST ({query} IN BOOLEAN MODE)", params + query_params
+
+
+class FullTextSearchFilter(filters.SearchFilter):
+    """
+    SearchFilter ranking results and using the FULLTEXT indexes on MySQL.
+
+    The ``search`` parameter is the same. On MySQL, models in FULLTEXT_INDEXES
+    are searched through their index. Each term must match a word starting
+    with it. Other models and databases fall back to SearchFilter, and rows
+    are ranked by how many terms each field matches, earlier fields
+    weighing more.
+
+    Results are sorted by decreasing ``search_rank`` unless an ordering is
+    requested, or the keyset pagination needs its own.
+    """
+
+    # innodb_ft_min_token_size, shorter words are not indexed
+    min_token_size = 3
+
+    def get_fulltext_fields(self, queryset, view, terms):
+        fields = FULLTEXT_INDEXES.get(queryset.model)
+        if fields is None or connections[queryset.db].vendor != 'mysql':
+            return None
+        if set(getattr(view, 'search_fields', ())) != set(fields):
+            return None
+        if any(len(term) < self.min_token_size for term in terms):
+            return None
+        return fields
+
+    def get_fulltext_terms(self, terms):
+        """Words of the search terms, operators split them as in the full-text parser."""
+        return [word for term in terms for word in BOOLEAN_OPERATORS.sub(' ', term).split()]
+
+    def get_fulltext_query(self, terms):
+        """Every term is required and matches words starting with it."""
+        return ' '.join(f'+{term}*' for term in terms)
+
+    def get_rank(self, search_fields, terms):
+        weights = []
+        for weight, search_field in enumerate(reversed(search_fields), 1):
+            lookup = self.construct_search(str(search_field))
+            for term in terms:
+                weights.append(Case(
+                    When(Q(**{lookup: term}), then=Value(weight)),
+                    default=Value(0), output_field=IntegerField(),
+                ))
+        return sum(weights[1:], weights[0])
+
+    def filter_queryset(self, request, queryset, view):
+        search_fields = getattr(view, 'search_fields', None)
+        terms = self.get_search_terms(request)
+        if not search_fields or not terms:
+            return queryset
+
+        fulltext_terms = self.get_fulltext_terms(terms)
+        fields = self.get_fulltext_fields(queryset, view, fulltext_terms) if fulltext_terms else None
+        if fields is not None:
+            query = self.get_fulltext_query(fulltext_terms)
+            queryset = queryset.annotate(search_rank=Match(*fields, query=query)).filter(search_rank__gt=0)
+        else:
+            rank = self.get_rank(search_fields, terms)
+            queryset = super().filter_queryset(request, queryset, view).annotate(search_rank=rank)
+
+        if isinstance(getattr(view, 'paginator', None), CursorPagination):
+            return queryset
+        ordering = queryset.query.order_by or queryset.model._meta.ordering
+        return queryset.order_by('-search_rank', *ordering)
@@ -1,18 +1,23 @@
 from django.contrib.auth import get_user_model
 from django.utils.translation import ugettext_lazy as _
 from django.conf import settings
-from django.core.signing import TimestampSigner
+from django.db import transaction
 
 from datetime import date
 
 from rest_framework import serializers
-from rest_framework.reverse import reverse
 
+from .links import get_link_builder, sign_channel
 from .models import Sprint, Task
 
 User = get_user_model()
 
 
+def date_representation(value):
+    """DateField representation of ISO 8601 dates."""
+    return None if value is None else value.isoformat()
+
+
 class SprintSerializer(serializers.ModelSerializer):
 
     links = serializers.SerializerMethodField()
@@ -21,20 +26,35 @@ class SprintSerializer(serializers.ModelSerializer):
         model = Sprint
         fields = ('id', 'name', 'description', 'end', 'links',)
 
+    # Columns read by to_row_representation()
+    values_fields = ('id', 'name', 'description', 'end')
+
     def get_links(self, obj):
-        request = self.context['request']
-        signer = TimestampSigner(settings.WATERCOOLER_SECRET)
+        return self.build_links(obj.pk)
+
+    def build_links(self, pk):
+        links = get_link_builder(self.context['request'])
         # signature for WebSocket server to validate if the browser client is credible.
         # Using for browser client to send wss.
-        channel = signer.sign(obj.pk)
+        channel = sign_channel(pk)
         proto = 'wss' if settings.WATERCOOLER_SECURE else 'ws'
         server = settings.WATERCOOLER_SERVER
         return {
-            'self': reverse('sprint-detail', kwargs={'pk': obj.pk}, request=request),
-            'tasks': reverse('task-list', request=request) + '?sprint={}'.format(obj.pk),
+            'self': links.url('sprint-detail', pk=pk),
+            'tasks': links.url('task-list') + '?sprint={}'.format(pk),
             'channel': f"{proto}://{server}/socket?channel={channel}"
         }
 
+    def to_row_representation(self, row):
+        """Same as to_representation() for a ``.values(*values_fields)`` row."""
+        return {
+            'id': row['id'],
+            'name': row['name'],
+            'description': row['description'],
+            'end': date_representation(row['end']),
+            'links': self.build_links(row['id']),
+        }
+
     def validate_end(self, value):
         new = self.instance is None
         changed = self.instance and self.instance.end != value
@@ -60,24 +80,53 @@ class TaskSerializer(serializers.ModelSerializer):
             'order', 'assigned', 'started', 'due', 'completed', 'links',
         )
 
+    # Model.get_FOO_display() rebuilds the choices mapping on every call.
+    status_labels = dict(Task.STATUS_CHOICES)
+
+    # Columns read by to_row_representation()
+    values_fields = (
+        'id', 'name', 'description', 'sprint', 'status', 'order',
+        f'assigned__{User.USERNAME_FIELD}', 'started', 'due', 'completed',
+    )
+
     def get_status_display(self, obj):
-        return obj.get_status_display()
+        return str(self.status_labels.get(obj.status, obj.status))
 
     def get_links(self, obj):
-        request = self.context['request']
+        username = obj.assigned.get_username() if obj.assigned_id else None
+        return self.build_links(obj.pk, obj.sprint_id, username)
+
+    def build_links(self, pk, sprint_id, username):
+        builder = get_link_builder(self.context['request'])
         links = {
-            'self': reverse('task-detail', kwargs={'pk': obj.pk}, request=request),
+            'self': builder.url('task-detail', pk=pk),
             'sprint': None,
             'assigned': None,
         }
-        if obj.sprint_id:
-            links.update(sprint=reverse('sprint-detail', kwargs={'pk': obj.sprint_id},
-                                        request=request))
-        if obj.assigned:
-            links.update(assigned=reverse('user-detail', kwargs={User.USERNAME_FIELD: obj.assigned},
-                         request=request))
+        if sprint_id:
+            links.update(sprint=builder.url('sprint-detail', pk=sprint_id))
+        if username is not None:
+            links.update(assigned=builder.url('user-detail', **{User.USERNAME_FIELD: username}))
         return links
 
+    def to_row_representation(self, row):
+        """Same as to_representation() for a ``.values(*values_fields)`` row."""
+        username = row[f'assigned__{User.USERNAME_FIELD}']
+        return {
+            'id': row['id'],
+            'name': row['name'],
+            'description': row['description'],
+            'sprint': row['sprint'],
+            'status': row['status'],
+            'status_display': str(self.status_labels.get(row['status'], row['status'])),
+            'order': row['order'],
+            'assigned': username,
+            'started': date_representation(row['started']),
+            'due': date_representation(row['due']),
+            'completed': date_representation(row['completed']),
+            'links': self.build_links(row['id'], row['sprint'], username),
+        }
+
     def validate_sprint(self, value):
         if self.instance and self.instance.pk:
             if value != self.instance.sprint:
@@ -110,6 +159,104 @@ class TaskSerializer(serializers.ModelSerializer):
         return attrs
 
 
+class TaskBulkListSerializer(serializers.ListSerializer):
+    """
+    Validate and apply a list of partial task updates together.
+
+    The tasks, sprints and users referenced by the whole list are loaded with
+    one query each before the items are validated, and the updates are saved
+    in a single transaction with ``bulk_update``.
+    """
+
+    max_length = 100
+
+    def _lookup_values(self, data, name):
+        values = (item.get(name) for item in data if isinstance(item, dict))
+        return {value for value in values if isinstance(value, (int, str))}
+
+    def to_internal_value(self, data):
+        if isinstance(data, list):
+            if len(data) > self.max_length:
+                msg = _('Ensure this list has no more than {0} items.').format(self.max_length)
+                raise serializers.ValidationError({'non_field_errors': [msg]})
+            ids = [value for value in self._lookup_values(data, 'id') if str(value).isdigit()]
+            sprints = [value for value in self._lookup_values(data, 'sprint') if str(value).isdigit()]
+            usernames = [str(value) for value in self._lookup_values(data, 'assigned')]
+            self.tasks = self.instance.select_related('sprint').in_bulk(ids)
+            self.sprints = Sprint.objects.in_bulk(sprints)
+            self.users = User.objects.in_bulk(usernames, field_name=User.USERNAME_FIELD)
+        return super().to_internal_value(data)
+
+    def validate(self, attrs):
+        ids = [item['instance'].pk for item in attrs]
+        if len(ids) != len(set(ids)):
+            raise serializers.ValidationError(_('Each task can only be updated once.'))
+        return attrs
+
+    def update(self, instance, validated_data):
+        fields = set()
+        self.previous_sprints = {}
+        tasks = []
+        for attrs in validated_data:
+            task = attrs.pop('instance')
+            self.previous_sprints[task.pk] = task.sprint_id
+            for name, value in attrs.items():
+                setattr(task, name, value)
+                fields.add(name)
+            tasks.append(task)
+        with transaction.atomic():
+            if fields:
+                Task.objects.bulk_update(tasks, sorted(fields))
+        return tasks
+
+
+class TaskBulkSerializer(serializers.Serializer):
+    """A partial update of one task, as part of a bulk update."""
+
+    id = serializers.IntegerField()
+    status = serializers.ChoiceField(choices=Task.STATUS_CHOICES, required=False)
+    order = serializers.IntegerField(min_value=-32768, max_value=32767, required=False)
+    sprint = serializers.IntegerField(required=False, allow_null=True)
+    assigned = serializers.CharField(required=False, allow_null=True)
+    started = serializers.DateField(required=False, allow_null=True)
+    completed = serializers.DateField(required=False, allow_null=True)
+
+    class Meta:
+        list_serializer_class = TaskBulkListSerializer
+
+    def validate(self, attrs):
+        task = self.parent.tasks.get(attrs.pop('id'))
+        if task is None:
+            raise serializers.ValidationError({'id': [_('Task not found.')]})
+        if 'sprint' in attrs and attrs['sprint'] is not None:
+            sprint = self.parent.sprints.get(attrs['sprint'])
+            if sprint is None:
+                msg = _('Invalid pk "{0}" - object does not exist.').format(attrs['sprint'])
+                raise serializers.ValidationError({'sprint': [msg]})
+            attrs['sprint'] = sprint
+        if 'assigned' in attrs and attrs['assigned'] is not None:
+            user = self.parent.users.get(attrs['assigned'])
+            if user is None:
+                msg = _('Object with {0}={1} does not exist.').format(User.USERNAME_FIELD, attrs['assigned'])
+                raise serializers.ValidationError({'assigned': [msg]})
+            attrs['assigned'] = user
+
+        # Same rules as TaskSerializer, checked against the resulting task.
+        rules = TaskSerializer(instance=task, context=self.context)
+        if 'sprint' in attrs:
+            try:
+                rules.validate_sprint(attrs['sprint'])
+            except serializers.ValidationError as e:
+                raise serializers.ValidationError({'sprint': e.detail})
+        state = {
+            name: attrs.get(name, getattr(task, name))
+            for name in ('sprint', 'status', 'started', 'completed')
+        }
+        rules.validate(state)
+        attrs['instance'] = task
+        return attrs
+
+
 class UserSerializer(serializers.ModelSerializer):
 
     full_name = serializers.CharField(source='get_full_name', read_only=True)
@@ -119,14 +266,29 @@ class UserSerializer(serializers.ModelSerializer):
         model = User
         fields = ('id', User.USERNAME_FIELD, 'full_name', 'is_active', 'links',)
 
+    # Columns read by to_row_representation()
+    values_fields = ('id', User.USERNAME_FIELD, 'first_name', 'last_name', 'is_active')
+
     def get_links(self, obj):
-        request = self.context['request']
-        username = obj.get_username()
+        return self.build_links(obj.get_username())
+
+    def build_links(self, username):
+        links = get_link_builder(self.context['request'])
         return {
-            'self': reverse('user-detail', kwargs={User.USERNAME_FIELD: username},
-                            request=request),
+            'self': links.url('user-detail', **{User.USERNAME_FIELD: username}),
             'tasks': '{0}?assigned={1}'.format(
-                reverse('task-list', request=request), username
+                links.url('task-list'), username
             )
         }
 
+    def to_row_representation(self, row):
+        """Same as to_representation() for a ``.values(*values_fields)`` row."""
+        username = row[User.USERNAME_FIELD]
+        return {
+            'id': row['id'],
+            User.USERNAME_FIELD: username,
+            # AbstractUser.get_full_name()
+            'full_name': f"{row['first_name']} {row['last_name']}".strip(),
+            'is_active': row['is_active'],
+            'links': self.build_links(username),
+        }
@@ -0,0 +1,71 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from rest_framework.authtoken.models import Token
+
+from .authentication import forget_credentials, token_cache
+from .cache import bump_versions, invalidate_task_lists
+from .models import Sprint, Task
+
+User = get_user_model()
+
+
+@receiver(post_save, sender=Sprint)
+@receiver(post_delete, sender=Sprint)
+def sprint_changed(sender, instance, **kwargs):
+    bump_versions('sprint')
+
+
+@receiver(post_init, sender=Task)
+def task_loaded(sender, instance, **kwargs):
+    # The sprint a change moves the task out of
+    instance._saved_sprint_id = instance.__dict__.get('sprint_id')
+
+
+@receiver(post_save, sender=Task)
+@receiver(post_delete, sender=Task)
+def task_changed(sender, instance, **kwargs):
+    bump_versions('task')
+    invalidate_task_lists(instance._saved_sprint_id, instance.sprint_id)
+    instance._saved_sprint_id = instance.sprint_id
+
+
+# Fields the verified credentials depend on
+AUTH_FIELDS = ('password', 'is_active')
+
+
+def get_auth_state(user):
+    # Deferred fields are left out instead of being loaded
+    return tuple(user.__dict__.get(name) for name in AUTH_FIELDS)
+
+
+@receiver(post_init, sender=User)
+def user_loaded(sender, instance, **kwargs):
+    instance._auth_state = get_auth_state(instance)
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, update_fields=None, **kwargs):
+    bump_versions('user')
+    token_cache.forget_user(instance.pk)
+    if update_fields is not None and not set(AUTH_FIELDS) & set(update_fields):
+        return
+    state = get_auth_state(instance)
+    if not created and state != instance._auth_state:
+        # Forget the credentials verified with the previous password or while active
+        forget_credentials(instance.pk)
+    instance._auth_state = state
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    bump_versions('user')
+    forget_credentials(instance.pk)
+    token_cache.forget_user(instance.pk)
+
+
+@receiver(post_save, sender=Token)
+@receiver(post_delete, sender=Token)
+def token_changed(sender, instance, **kwargs):
+    token_cache.forget(instance.key)
@@ -114,6 +114,14 @@
         },
 
         moveTo: function (status, sprint, order) {
+            let updates = this.moveUpdates(status, sprint, order);
+            if (updates === false) {
+                return false;
+            }
+            this.save(updates);
+        },
+
+        moveUpdates: function (status, sprint, order) {
             let updates = {
                 status: status,
                 sprint: sprint,
@@ -141,7 +149,7 @@
             } else if (updates.status < 4 && this.get('completed')) {
                 updates.completed = null;
             }
-            this.save(updates);
+            return updates;
         }
     });
 
@@ -191,6 +199,18 @@
             url: data.tasks,
             getBacklog: function () {
                 this.fetch({remove: false, data: {backlog: 'True'}});
+            },
+            bulkUpdate: function (updates) {
+                // Save several partial updates in one request.
+                let self = this;
+                return $.ajax({
+                    url: this.url + '/bulk',
+                    type: 'PATCH',
+                    contentType: 'application/json',
+                    data: JSON.stringify(updates)
+                }).done(function (data) {
+                    self.set(data, {remove: false});
+                });
             }
         });
         app.tasks = new app.collections.Tasks();
@@ -19,17 +19,40 @@ constructor属性的含义就是指向该对象的构造函数，所有函数（
  */
 
 (function ($, Backbone, _, app) {
-    let Socket = function (server) {
-        this.server = server;
+    // Actions of the compact format, see watercooler.COMPACT_ACTIONS
+    let compactActions = {a: 'add', u: 'update', r: 'remove', d: 'update'};
+    // Close code of rejected channel tokens, see watercooler.INVALID_CHANNEL
+    let invalidChannel = 4001;
+
+    let Socket = function (server, options) {
+        this.options = options || {};
+        this.setServer(server);
         this.ws = null;
         this.connected = new $.Deferred();
+        // Sequence id of the last model event, sent when reconnecting to get the missed ones
+        this.lastSeq = null;
+        this.closing = false;
+        this.retries = 0;
         this.open();
     };
     
     Socket.prototype = _.extend(Socket.prototype, Backbone.Events, {
+        setServer: function (server) {
+            if (this.options.compact) {
+                // Events arrive as arrays, updates with their changed fields only when diffs is set
+                server += (server.indexOf('?') === -1 ? '?' : '&') + 'format=compact' +
+                    (this.options.diffs ? '&diffs=1' : '');
+            }
+            this.server = server;
+        },
+
         open: function () {
             if (this.ws === null) {
-                this.ws = new WebSocket(this.server);
+                let server = this.server;
+                if (this.lastSeq) {
+                    server += '&since=' + encodeURIComponent(this.lastSeq);
+                }
+                this.ws = new WebSocket(server);
                 this.ws.onopen = $.proxy(this.onopen, this);
                 this.ws.onmessage = $.proxy(this.onmessage, this);
                 this.ws.onclose = $.proxy(this.onclose, this);
@@ -39,21 +62,66 @@ constructor属性的含义就是指向该对象的构造函数，所有函数（
         },
 
         close: function () {
+            this.closing = true;
             if (this.ws && this.ws.close) {
+                this.ws.onclose = null;
                 this.ws.close();
             }
+            this.reset();
+        },
+
+        reset: function () {
             this.ws = null;
             this.connected = new $.Deferred();
             this.trigger('closed');
         },
 
+        reconnect: function () {
+            // Back off up to 30 seconds while the server is away
+            let delay = Math.min(30000, 1000 * Math.pow(2, this.retries));
+            this.retries += 1;
+            setTimeout($.proxy(function () {
+                if (!this.closing) {
+                    this.open();
+                }
+            }, this), delay);
+        },
+
         onopen: function () {
+            // The channel token is only checked now, the backoff is reset once subscribed
             this.connected.resolve();
             this.trigger('open');
         },
 
+        decode: function (data) {
+            let result = JSON.parse(data);
+            if (_.isArray(result)) {
+                result = {
+                    model: result[0],
+                    id: result[1],
+                    action: compactActions[result[2]] || result[2],
+                    body: result.length > 3 ? result[3] : null,
+                    seq: result.length > 4 ? result[4] : null,
+                    partial: result[2] === 'd'
+                };
+            }
+            return result;
+        },
+
         onmessage: function (message) {
-            let result = JSON.parse(message.data);
+            let result = this.decode(message.data);
+            if (result.seq) {
+                this.lastSeq = result.seq;
+            }
+            if (result.action === 'subscribed') {
+                this.retries = 0;
+                return;
+            }
+            if (result.action === 'resync') {
+                // The missed events are gone, everything has to be loaded again
+                this.trigger('resync');
+                return;
+            }
             this.trigger('message', result, message);
             if (result.model && result.action) {
                 this.trigger(result.model + ':' + result.action,
@@ -61,13 +129,23 @@ constructor属性的含义就是指向该对象的构造函数，所有函数（
             }
         },
 
-        onclose: function () {
-            this.close();
+        onclose: function (event) {
+            this.reset();
+            if (this.closing) {
+                return;
+            }
+            if (event && event.code === invalidChannel) {
+                // Reconnecting with the same token would be rejected again,
+                // listeners set a fresh channel with setServer() and reconnect.
+                this.trigger('expired');
+            } else {
+                this.reconnect();
+            }
         },
 
         onerror: function (error) {
+            // The socket is closed next, onclose reconnects
             this.trigger('error', error);
-            this.close();
         },
 
         send: function (message) {
@@ -402,24 +402,23 @@
             }
             task = app.tasks.get(task);
             if (task !== this.task) {
-                // TODO: Handle reordering tasks.
                 // Task is being moved in front of this.task
-                let order = this.task.get('order');
-                let tasks = app.tasks.filter(function (model) {
-                    return model.get('id') !== task.get('id') &&
-                        model.get('status') === self.task.get('status') &&
-                        model.get('sprint') === self.task.get('sprint') &&
-                        model.get('order') >= order;
-                });
-
-                _.each(tasks, function (model, i) {
-                    model.save({order: order + (i + 1)});
-                });
-
-                task.moveTo(
-                    this.task.get('status'),
-                    this.task.get('sprint'),
-                    order);
+                let target = this.task,
+                    order = target.get('order'),
+                    moved = task.moveUpdates(target.get('status'), target.get('sprint'), order);
+                if (moved !== false) {
+                    let tasks = app.tasks.filter(function (model) {
+                        return model.get('id') !== task.get('id') &&
+                            model.get('status') === target.get('status') &&
+                            model.get('sprint') === target.get('sprint') &&
+                            model.get('order') >= order;
+                    });
+                    let updates = _.map(tasks, function (model, i) {
+                        return {id: model.get('id'), order: order + (i + 1)};
+                    });
+                    updates.push(_.extend({id: task.get('id')}, moved));
+                    app.tasks.bulkUpdate(updates);
+                }
             }
             this.trigger('drop', task);
             this.leave();
@@ -552,7 +551,7 @@
         connectSocket: function () {
             let links = this.sprint && this.sprint.get('links');
             if (links && links.channel) {
-                this.socket = new app.Socket(links.channel);
+                this.socket = new app.Socket(links.channel, {compact: true, diffs: true});
                 this.socket.on('task:dragstart', function (task) {
                     let view = this.tasks[task];
                     if (view) {
@@ -581,6 +580,7 @@
                     let model = app.tasks.get(task);
                     if (model) {
                         if (result.body) {  // add from websocket result, 直接从结果获得数据
+                            // Diffs only carry the changed fields, set() merges them
                             model.set(result.body);
                         } else {  // fetch from API, 会再次发送请求去取数据，而数据已经在结果中
                             model.fetch();
@@ -591,6 +591,20 @@
                 this.socket.on('task:remove', function (task) {
                     app.tasks.remove({id: task});
                 }, this);
+
+                this.socket.on('expired', function () {
+                    // Fetch the sprint again for a freshly signed channel
+                    this.sprint.fetch().always($.proxy(function () {
+                        this.socket.setServer(this.sprint.get('links').channel);
+                        this.socket.reconnect();
+                    }, this));
+                }, this);
+
+                this.socket.on('resync', function () {
+                    // Too many events were missed while disconnected
+                    this.sprint.fetchTasks();
+                    app.tasks.getBacklog();
+                }, this);
             }
         },
 
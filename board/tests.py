@@ -1,3 +1,674 @@
-from django.test import TestCase
+import base64
+import json
+import time
+
+from datetime import date, timedelta
+from unittest import mock
+
+import requests
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import connection
+from django.test import TestCase, override_settings
+
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.reverse import reverse
+from rest_framework.test import APIClient, APIRequestFactory
+
+from . import db
+from .authentication import CachedTokenAuthentication, credentials_cache, token_cache
+from .cache import task_list_cache
+from .hooks import CircuitBreaker, CircuitOpenError, HookDispatcher, HookTransport
+from .links import LinkBuilder
+from .models import Sprint, Task
+from .renderers import FastJSONRenderer
+from .search import FullTextSearchFilter
+from .serializers import SprintSerializer, TaskSerializer, UserSerializer
 
 # Create your tests here.
+
+User = get_user_model()
+
+
+class APITestCase(TestCase):
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+        # Update hooks are queued on a mock instead of being sent to a websocket server
+        patcher = mock.patch('board.views.get_dispatcher')
+        self.dispatcher = patcher.start().return_value
+        self.addCleanup(patcher.stop)
+        self.user = User.objects.create_user(username='admin', password='test')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+
+class QueryCountTestCase(APITestCase):
+    """List and detail endpoints run a constant number of queries."""
+
+    sizes = (1, 25, 100)
+
+    def create_data(self, size):
+        end = date.today() + timedelta(days=1)
+        for i in range(size):
+            user = User.objects.create_user(username=f'user{i}')
+            sprint = Sprint.objects.create(name=f'Sprint {i}', end=end + timedelta(days=i))
+            Task.objects.create(name=f'Task {i}', sprint=sprint, assigned=user,
+                                status=Task.STATUS_IN_PROGRESS)
+
+    def assertListQueries(self, url, num):
+        for size in self.sizes:
+            with self.subTest(size=size):
+                Task.objects.all().delete()
+                Sprint.objects.all().delete()
+                User.objects.exclude(pk=self.user.pk).delete()
+                self.create_data(size)
+                with self.assertNumQueries(num):
+                    response = self.client.get(url, {'page_size': 100})
+                self.assertEqual(response.status_code, 200)
+                self.assertGreaterEqual(len(response.data['results']), size)
+
+    def test_task_list(self):
+        # COUNT(*) for the page and a single SELECT joined with the users
+        self.assertListQueries('/api/tasks', 2)
+
+    def test_sprint_list(self):
+        self.assertListQueries('/api/sprints', 2)
+
+    def test_user_list(self):
+        self.assertListQueries('/api/users', 2)
+
+    def test_task_detail(self):
+        self.create_data(1)
+        task = Task.objects.get()
+        with self.assertNumQueries(1):
+            response = self.client.get(f'/api/tasks/{task.pk}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['assigned'], 'user0')
+        self.assertEqual(response.data['status_display'], 'In Progress')
+
+
+class LinkBuilderTestCase(TestCase):
+    """Links are the same as the ones built by reverse()."""
+
+    def assertSameLinks(self, path):
+        request = Request(APIRequestFactory().get(path, HTTP_HOST='testserver:8000'))
+        builder = LinkBuilder(request)
+        self.assertEqual(builder.url('task-list'), reverse('task-list', request=request))
+        for value in (1, 42, 'admin', 'jane+doe@example', 'Zoë', 'a b'):
+            with self.subTest(value=value):
+                self.assertEqual(builder.url('user-detail', username=value),
+                                 reverse('user-detail', kwargs={'username': value}, request=request))
+                self.assertEqual(builder.url('task-detail', pk=value),
+                                 reverse('task-detail', kwargs={'pk': value}, request=request))
+
+    def test_links(self):
+        self.assertSameLinks('/api/tasks')
+
+    def test_format_override(self):
+        self.assertSameLinks('/api/tasks?format=json')
+
+
+@override_settings(BOARD_CONDITIONAL_GET=True)
+class ConditionalGetTestCase(APITestCase):
+    """Unchanged collections are revalidated without querying the database."""
+
+    def setUp(self):
+        super().setUp()
+        self.task = Task.objects.create(name='Task')
+
+    def test_not_modified(self):
+        response = self.client.get('/api/tasks')
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/tasks', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_modified(self):
+        etag = self.client.get(f'/api/tasks/{self.task.pk}')['ETag']
+        response = self.client.patch(f'/api/tasks/{self.task.pk}', {'name': 'Renamed'})
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(f'/api/tasks/{self.task.pk}', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_query_string(self):
+        etag = self.client.get('/api/tasks')['ETag']
+        response = self.client.get('/api/tasks', {'backlog': 'True'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_modified_same_second(self):
+        url = f'/api/tasks/{self.task.pk}'
+        with mock.patch('time.time', return_value=1500000000.5):
+            last_modified = self.client.get(url)['Last-Modified']
+            self.client.patch(url, {'name': 'Renamed'})
+            response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 200)
+
+    def test_channel_refresh(self):
+        Sprint.objects.create(name='Sprint', end=date.today())
+        last_modified = self.client.get('/api/sprints')['Last-Modified']
+        self.assertEqual(self.client.get('/api/sprints', HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+        with mock.patch('board.views.channel_bucket', return_value=int(time.time()) + 3600):
+            response = self.client.get('/api/sprints', HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(BOARD_CONDITIONAL_GET=False)
+    def test_disabled(self):
+        self.assertFalse(self.client.get('/api/tasks').has_header('ETag'))
+
+
+@override_settings(BOARD_TASK_LIST_CACHE=True)
+class TaskListCacheTestCase(APITestCase):
+    """Task lists are cached per sprint and invalidated by writes."""
+
+    def setUp(self):
+        super().setUp()
+        end = date.today() + timedelta(days=1)
+        self.first = Sprint.objects.create(end=end)
+        self.second = Sprint.objects.create(end=end + timedelta(days=1))
+        self.task = Task.objects.create(name='First', sprint=self.first)
+        self.other = Task.objects.create(name='Second', sprint=self.second)
+
+    def test_cached(self):
+        response = self.client.get('/api/tasks', {'sprint': self.first.pk})
+        with self.assertNumQueries(0):
+            cached = self.client.get('/api/tasks', {'sprint': self.first.pk})
+        self.assertEqual(cached.data, response.data)
+
+    def test_invalidate_scope(self):
+        self.client.get('/api/tasks', {'sprint': self.first.pk})
+        self.client.get('/api/tasks')
+        self.client.patch(f'/api/tasks/{self.other.pk}', {'name': 'Renamed'})
+        with self.assertNumQueries(0):
+            self.client.get('/api/tasks', {'sprint': self.first.pk})
+        response = self.client.get('/api/tasks')
+        self.assertEqual(response.data['results'][1]['name'], 'Renamed')
+
+    def test_invalidate_move(self):
+        self.client.get('/api/tasks', {'sprint': self.first.pk})
+        self.client.patch(f'/api/tasks/{self.task.pk}', {'sprint': self.second.pk})
+        response = self.client.get('/api/tasks', {'sprint': self.first.pk})
+        self.assertEqual(response.data['count'], 0)
+
+    def test_invalidate_signals(self):
+        self.client.get('/api/tasks', {'sprint': self.first.pk})
+        self.client.get('/api/tasks', {'sprint': self.second.pk})
+        task = Task.objects.get(pk=self.task.pk)
+        task.sprint = self.second
+        task.save()
+        self.assertEqual(self.client.get('/api/tasks', {'sprint': self.first.pk}).data['count'], 0)
+        self.assertEqual(self.client.get('/api/tasks', {'sprint': self.second.pk}).data['count'], 2)
+        task.delete()
+        self.assertEqual(self.client.get('/api/tasks', {'sprint': self.second.pk}).data['count'], 1)
+
+    def test_evictions(self):
+        self.client.get('/api/tasks', {'sprint': self.first.pk})
+        evictions = task_list_cache.stats()['evictions']
+        task_list_cache.cache.clear()
+        self.client.get('/api/tasks', {'sprint': self.first.pk})
+        self.assertEqual(task_list_cache.stats()['evictions'], evictions + 1)
+
+    @override_settings(BOARD_TASK_LIST_CACHE=False)
+    def test_disabled(self):
+        stats = task_list_cache.stats()
+        self.client.get('/api/tasks', {'sprint': self.first.pk})
+        self.client.get('/api/tasks', {'sprint': self.first.pk})
+        self.assertEqual(task_list_cache.stats(), stats)
+
+
+class KeysetPaginationTestCase(APITestCase):
+    """Cursor pages walk the whole collection in both directions."""
+
+    def setUp(self):
+        super().setUp()
+        today = date.today()
+        for i in range(23):
+            due = None if i % 4 == 0 else today + timedelta(days=i % 3)
+            Task.objects.create(name=f'Task {i}', order=i % 5, due=due)
+
+    def walk(self, params):
+        pages, url = [], '/api/tasks'
+        params = dict(params, cursor='', page_size=5)
+        while url:
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('count', response.data)
+            pages.append(response.data)
+            url, params = response.data['next'], {}
+        return pages
+
+    def assertWalk(self, ordering):
+        expected = self.client.get('/api/tasks', {'ordering': ordering, 'page_size': 100}).data['results']
+        pages = self.walk({'ordering': ordering})
+        ids = [task['id'] for page in pages for task in page['results']]
+        self.assertEqual(len(ids), len(set(ids)))
+        self.assertEqual(sorted(ids), sorted(task['id'] for task in expected))
+        # Walking back from the last page gives the same pages.
+        previous = self.client.get(pages[-1]['previous']).data
+        self.assertEqual(previous['results'], pages[-2]['results'])
+        return ids
+
+    def test_order(self):
+        ids = self.assertWalk('order')
+        orders = list(Task.objects.filter(pk__in=ids).in_bulk(ids)[pk].order for pk in ids)
+        self.assertEqual(orders, sorted(orders))
+
+    def test_nullable_descending(self):
+        self.assertWalk('-due')
+
+    def test_nullable(self):
+        self.assertWalk('due,-order')
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/tasks', {'cursor': 'invalid'})
+        self.assertEqual(response.status_code, 404)
+
+
+class TaskSearchTestCase(APITestCase):
+    """Searches match every term and rank name matches first."""
+
+    def setUp(self):
+        super().setUp()
+        Task.objects.create(name='Sign in with email', description='Send a login link by email')
+        Task.objects.create(name='Fix the login page', description='Users cannot sign in')
+        Task.objects.create(name='Export reports', description='')
+
+    def search(self, **params):
+        response = self.client.get('/api/tasks', params)
+        self.assertEqual(response.status_code, 200)
+        return [task['name'] for task in response.data['results']]
+
+    def test_ranked(self):
+        self.assertEqual(self.search(search='login'), ['Fix the login page', 'Sign in with email'])
+
+    def test_all_terms(self):
+        self.assertEqual(self.search(search='login email'), ['Sign in with email'])
+
+    def test_ordering(self):
+        self.assertEqual(self.search(search='login', ordering='-name'), ['Sign in with email', 'Fix the login page'])
+
+    def test_keyset_pagination(self):
+        self.assertEqual(len(self.search(search='login', cursor='')), 2)
+
+    def test_hyphenated_terms(self):
+        search = FullTextSearchFilter()
+        words = search.get_fulltext_terms(['sign-in', 'page'])
+        self.assertEqual(words, ['sign', 'in', 'page'])
+        self.assertEqual(search.get_fulltext_query(words), '+sign* +in* +page*')
+        view = mock.Mock(search_fields=('name', 'description'))
+        with mock.patch.object(connection, 'vendor', 'mysql'):
+            # "in" is too short to be indexed, the search falls back to SearchFilter
+            self.assertIsNone(search.get_fulltext_fields(Task.objects.all(), view, words))
+            self.assertEqual(search.get_fulltext_fields(Task.objects.all(), view, ['page']), ('name', 'description'))
+
+
+class ValuesListTestCase(APITestCase):
+    """Rows rendered by the fast path are the same bytes as serialized instances."""
+
+    def setUp(self):
+        super().setUp()
+        self.user.first_name = 'Zoë'
+        self.user.save()
+        sprint = Sprint.objects.create(name='Sprint \u2028 1', end=date.today())
+        Task.objects.create(name='Tâche "1"', description='Line\nbreak\x01', sprint=sprint,
+                            assigned=self.user, status=Task.STATUS_IN_PROGRESS, started=date.today())
+        Task.objects.create(name='Backlog')
+        self.request = Request(APIRequestFactory().get('/api/tasks', HTTP_HOST='testserver'))
+
+    def test_same_bytes(self):
+        for serializer_class in (SprintSerializer, TaskSerializer, UserSerializer):
+            with self.subTest(serializer=serializer_class.__name__):
+                queryset = serializer_class.Meta.model._default_manager.order_by('pk')
+                context = {'request': self.request}
+                expected = JSONRenderer().render(serializer_class(queryset, many=True, context=context).data)
+                serializer = serializer_class(context=context)
+                rows = queryset.values(*serializer.values_fields)
+                data = [serializer.to_row_representation(row) for row in rows]
+                self.assertEqual(FastJSONRenderer().render(data), expected)
+
+
+class TaskBulkUpdateTestCase(APITestCase):
+    """Several tasks are updated with a constant number of queries."""
+
+    def setUp(self):
+        super().setUp()
+        end = date.today() + timedelta(days=1)
+        self.sprint = Sprint.objects.create(end=end)
+        self.tasks = [Task.objects.create(name=f'Task {i}', sprint=self.sprint, order=i) for i in range(10)]
+
+    def test_reorder(self):
+        updates = [
+            {'id': task.pk, 'order': 10 - i, 'status': Task.STATUS_IN_PROGRESS, 'assigned': 'admin'}
+            for i, task in enumerate(self.tasks)
+        ]
+        # Tasks, users, and one UPDATE inside a savepoint
+        with self.assertNumQueries(5):
+            response = self.client.patch('/api/tasks/bulk', updates, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual([item['order'] for item in response.data], list(range(10, 0, -1)))
+        self.assertEqual(Task.objects.filter(status=Task.STATUS_IN_PROGRESS, assigned=self.user).count(), 10)
+
+    def test_validation(self):
+        done = Task.objects.create(name='Done', sprint=self.sprint, status=Task.STATUS_DONE)
+        updates = [
+            {'id': self.tasks[0].pk, 'order': 1},
+            {'id': done.pk, 'sprint': None},
+            {'id': 0, 'order': 1},
+            {'id': self.tasks[1].pk, 'sprint': None, 'status': Task.STATUS_TESTING},
+        ]
+        response = self.client.patch('/api/tasks/bulk', updates, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data[0], {})
+        self.assertIn('sprint', response.data[1])
+        self.assertIn('id', response.data[2])
+        self.assertIn('non_field_errors', response.data[3])
+        self.assertEqual(Task.objects.get(pk=self.tasks[0].pk).order, 0)
+
+
+class CachedBasicAuthenticationTestCase(APITestCase):
+    """Verified credentials skip the password hasher until the user changes."""
+
+    def setUp(self):
+        super().setUp()
+        credentials_cache.clear()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION='Basic ' + base64.b64encode(b'admin:test').decode('ascii'))
+
+    def test_cached(self):
+        self.assertEqual(self.client.get('/api/users').status_code, 200)
+        with mock.patch('django.contrib.auth.backends.ModelBackend.authenticate') as authenticate:
+            self.assertEqual(self.client.get('/api/users').status_code, 200)
+        authenticate.assert_not_called()
+        self.assertEqual(credentials_cache.hits, 1)
+
+    def test_wrong_password(self):
+        self.assertEqual(self.client.get('/api/users').status_code, 200)
+        self.client.credentials(HTTP_AUTHORIZATION='Basic ' + base64.b64encode(b'admin:wrong').decode('ascii'))
+        self.assertEqual(self.client.get('/api/users').status_code, 401)
+
+    def test_password_changed(self):
+        self.assertEqual(self.client.get('/api/users').status_code, 200)
+        self.user.set_password('changed')
+        self.user.save(update_fields=['password'])
+        self.assertEqual(len(credentials_cache), 0)
+        self.assertEqual(self.client.get('/api/users').status_code, 401)
+
+    def test_unrelated_changes_kept(self):
+        self.assertEqual(self.client.get('/api/users').status_code, 200)
+        self.user.first_name = 'Admin'
+        self.user.save()
+        other = User.objects.create_user(username='other', password='test')
+        other.set_password('changed')
+        other.save()
+        self.assertEqual(len(credentials_cache), 1)
+
+    def test_deactivated(self):
+        self.assertEqual(self.client.get('/api/users').status_code, 200)
+        # Bypass the signals, the cached entry is still checked against the user
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertEqual(self.client.get('/api/users').status_code, 401)
+        self.assertEqual(len(credentials_cache), 0)
+
+
+class CachedTokenAuthenticationTestCase(APITestCase):
+    """Resolved tokens skip the token lookup until the token or its user changes."""
+
+    def setUp(self):
+        super().setUp()
+        token_cache.clear()
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_cached(self):
+        self.assertEqual(self.client.get('/api/users').status_code, 200)
+        authentication = CachedTokenAuthentication()
+        with self.assertNumQueries(0):
+            user, token = authentication.authenticate_credentials(self.token.key)
+        self.assertEqual(user, self.user)
+        self.assertEqual(token.key, self.token.key)
+        # Every request gets its own instance
+        self.assertIsNot(authentication.authenticate_credentials(self.token.key)[0], user)
+
+    def test_token_deleted(self):
+        self.assertEqual(self.client.get('/api/users').status_code, 200)
+        self.token.delete()
+        self.assertEqual(self.client.get('/api/users').status_code, 401)
+
+    def test_deactivated(self):
+        self.assertEqual(self.client.get('/api/users').status_code, 200)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get('/api/users').status_code, 401)
+
+    @override_settings(BOARD_TOKEN_CACHE='default')
+    def test_deactivated_elsewhere(self):
+        self.assertEqual(self.client.get('/api/users').status_code, 200)
+        # Bypass the signals, as a change made by another process
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        # Once the local entry expired, the shared one is checked against the user
+        token_cache.local.clear()
+        self.assertEqual(self.client.get('/api/users').status_code, 401)
+        self.assertIsNone(caches['default'].get(token_cache.prefix + token_cache.get_key(self.token.key)))
+
+    @override_settings(BOARD_TOKEN_CACHE='default')
+    def test_shared_holds_primary_key(self):
+        self.assertEqual(self.client.get('/api/users').status_code, 200)
+        key = token_cache.prefix + token_cache.get_key(self.token.key)
+        self.assertEqual(caches['default'].get(key), self.user.pk)
+
+
+class DatabaseConnectionTestCase(APITestCase):
+    """Reused connections are health checked and requests report their database time."""
+
+    def test_unusable_connection_closed(self):
+        connection.ensure_connection()
+        connection.board_last_used = time.monotonic() - 60
+        with mock.patch.object(connection, 'is_usable', return_value=False), \
+                mock.patch.object(connection, 'close') as close:
+            db.check_connections()
+        close.assert_called_once_with()
+
+    def test_recently_used_not_checked(self):
+        connection.ensure_connection()
+        db.mark_connections()
+        with mock.patch.object(connection, 'is_usable') as is_usable:
+            db.check_connections()
+        is_usable.assert_not_called()
+
+    def test_inherited_connection_kept(self):
+        connection.ensure_connection()
+        inherited = connection.connection
+        try:
+            db.discard_connections()
+            self.assertIsNone(connection.connection)
+            self.assertIs(db._inherited[-1], inherited)
+        finally:
+            db._inherited.remove(inherited)
+            connection.connection = inherited
+
+    @override_settings(MIDDLEWARE=['board.db.DatabaseTimingMiddleware'])
+    def test_server_timing(self):
+        response = self.client.get('/api/tasks')
+        self.assertEqual(response.status_code, 200)
+        self.assertRegex(response['Server-Timing'], r'^db-connect;dur=[\d.]+, db-query;dur=[\d.]+;desc="\d+ queries"$')
+
+
+class FakeTransport(object):
+    """Transport recording the batches instead of sending them."""
+
+    def __init__(self):
+        self.breaker = CircuitBreaker()
+        self.batches = []
+
+    def send(self, method, url, body, headers):
+        self.batches.append(json.loads(body.decode('utf-8')))
+
+    def close(self):
+        pass
+
+
+class HookDispatcherTestCase(TestCase):
+    """Queued events are coalesced per object and delivered in batches."""
+
+    def setUp(self):
+        self.transport = FakeTransport()
+        # A long window keeps every event in the batch flushed by close()
+        self.dispatcher = HookDispatcher(transport=self.transport, window=10)
+
+    def test_coalesced(self):
+        self.dispatcher.submit('task', 1, 'update', b'{"name":"A"}', [1])
+        self.dispatcher.submit('task', 2, 'remove', sprints=[1])
+        self.dispatcher.submit('task', 1, 'update', b'{"name":"B"}', [2, 1])
+        self.dispatcher.close()
+        self.assertEqual(self.transport.batches, [[
+            {'model': 'task', 'id': '1', 'action': 'update', 'sprints': [1, 2], 'body': {'name': 'B'}},
+            {'model': 'task', 'id': '2', 'action': 'remove', 'sprints': [1], 'body': None},
+        ]])
+        stats = self.dispatcher.stats()
+        self.assertEqual((stats['queued'], stats['coalesced'], stats['batches'], stats['sent']), (3, 1, 1, 2))
+
+    def test_add_then_update(self):
+        self.dispatcher.submit('task', 1, 'add', b'{"name":"A"}', [None])
+        self.dispatcher.submit('task', 1, 'update', b'{"name":"B"}')
+        self.dispatcher.close()
+        event, = self.transport.batches[0]
+        self.assertEqual((event['action'], event['body']), ('add', {'name': 'B'}))
+        # The update concerns every sprint, so does the merged event
+        self.assertNotIn('sprints', event)
+
+    def test_batches_in_order(self):
+        # The first batch is slow, as when the transport retries it with backoff
+        delays = iter([0.2])
+        send = self.transport.send
+        self.transport.send = lambda *args: time.sleep(next(delays, 0)) or send(*args)
+        dispatcher = HookDispatcher(transport=self.transport, window=0.01)
+        dispatcher.submit('task', 1, 'update', b'{"order":1}')
+        time.sleep(0.05)
+        dispatcher.submit('task', 1, 'update', b'{"order":2}')
+        dispatcher.close()
+        self.dispatcher.close()
+        self.assertEqual([batch[0]['body'] for batch in self.transport.batches], [{'order': 1}, {'order': 2}])
+
+    def test_queue_full(self):
+        # Without its collector the queue is never drained
+        with mock.patch('board.hooks.threading.Thread'):
+            dispatcher = HookDispatcher(transport=self.transport, max_queue=1)
+        self.assertTrue(dispatcher.submit('task', 1, 'update'))
+        with self.assertLogs('board.hooks', 'WARNING'):
+            self.assertFalse(dispatcher.submit('task', 2, 'update'))
+        self.assertEqual(dispatcher.stats()['dropped'], 1)
+        dispatcher._queue.get_nowait()
+        dispatcher.close()
+        self.dispatcher.close()
+
+
+@mock.patch('board.hooks.time.monotonic', return_value=1000.0)
+class CircuitBreakerTestCase(TestCase):
+    """The circuit opens after consecutive failures and lets one trial call through after the cooldown."""
+
+    def setUp(self):
+        self.breaker = CircuitBreaker(threshold=2, cooldown=30)
+
+    def open(self):
+        self.breaker.failure()
+        self.assertEqual(self.breaker.state, 'closed')
+        self.breaker.failure()
+        self.assertEqual(self.breaker.state, 'open')
+
+    def test_open(self, monotonic):
+        self.assertTrue(self.breaker.allow())
+        with self.assertLogs('board.hooks', 'WARNING'):
+            self.open()
+        self.assertFalse(self.breaker.allow())
+
+    def test_success_resets(self, monotonic):
+        self.breaker.failure()
+        self.breaker.success()
+        self.breaker.failure()
+        self.assertEqual(self.breaker.state, 'closed')
+
+    def test_trial_success(self, monotonic):
+        with self.assertLogs('board.hooks', 'WARNING'):
+            self.open()
+        monotonic.return_value += 31
+        self.assertEqual(self.breaker.state, 'half-open')
+        self.assertTrue(self.breaker.allow())
+        # A single trial call at a time
+        self.assertFalse(self.breaker.allow())
+        self.breaker.success()
+        self.assertEqual(self.breaker.state, 'closed')
+        self.assertTrue(self.breaker.allow())
+
+    def test_trial_failure(self, monotonic):
+        with self.assertLogs('board.hooks', 'WARNING'):
+            self.open()
+            monotonic.return_value += 31
+            self.assertTrue(self.breaker.allow())
+            self.breaker.failure()
+        self.assertEqual(self.breaker.state, 'open')
+        monotonic.return_value += 29
+        self.assertFalse(self.breaker.allow())
+
+
+class HookTransportTestCase(TestCase):
+    """Only server errors count against the server, idempotent requests are retried."""
+
+    url = 'http://localhost:8080/batch'
+
+    def setUp(self):
+        self.transport = HookTransport(failure_threshold=1, retries=2)
+        patcher = mock.patch.object(self.transport.session, 'request')
+        self.request = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def respond(self, status):
+        response = requests.Response()
+        response.status_code = status
+        response.url = self.url
+        self.request.return_value = response
+
+    def send(self):
+        return self.transport.send('PUT', self.url, b'[]', {})
+
+    def test_success(self):
+        self.respond(200)
+        self.assertEqual(self.send().status_code, 200)
+        self.assertEqual(self.transport.breaker.state, 'closed')
+
+    def test_server_error(self):
+        self.respond(503)
+        with self.assertLogs('board.hooks', 'WARNING'), self.assertRaises(requests.exceptions.HTTPError):
+            self.send()
+        self.assertEqual(self.transport.breaker.state, 'open')
+        with self.assertRaises(CircuitOpenError):
+            self.send()
+        self.assertEqual(self.request.call_count, 1)
+
+    def test_client_error(self):
+        self.respond(403)
+        with self.assertRaises(requests.exceptions.HTTPError):
+            self.send()
+        self.assertEqual(self.transport.breaker.failures, 0)
+
+    def test_connection_error(self):
+        self.request.side_effect = requests.exceptions.ConnectionError
+        with self.assertLogs('board.hooks', 'WARNING'), self.assertRaises(requests.exceptions.ConnectionError):
+            self.send()
+        self.assertEqual(self.transport.breaker.state, 'open')
+
+    def test_retry_policy(self):
+        retry = self.transport.session.get_adapter(self.url).max_retries
+        self.assertEqual(retry.total, 2)
+        for method in ('PUT', 'DELETE'):
+            for status in (502, 503, 504):
+                self.assertTrue(retry.is_retry(method, status))
+        self.assertFalse(retry.is_retry('POST', 503))
+        self.assertFalse(retry.is_retry('PUT', 500))
@@ -1,18 +1,40 @@
 import hashlib
-import requests
+import json
+import operator
+
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+from functools import reduce
 
 from django.conf import settings
-from django.core.signing import TimestampSigner
 from django.contrib.auth import get_user_model
-
-from rest_framework import viewsets, authentication, permissions, filters
-from rest_framework.renderers import JSONRenderer
-from rest_framework.pagination import PageNumberPagination
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F, Q
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from rest_framework import viewsets, permissions, filters
+from rest_framework.decorators import action
+from rest_framework.renderers import BrowsableAPIRenderer
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+from rest_framework.utils.urls import replace_query_param
+from rest_framework.response import Response
+from rest_framework.views import APIView
 import django_filters
 from django_filters.rest_framework import DjangoFilterBackend
 
+from . import db
+from .authentication import (
+    CachedBasicAuthentication, CachedTokenAuthentication, credentials_cache, token_cache,
+)
+from .cache import bump_versions, get_versions, invalidate_task_lists, task_list_cache, task_list_scope
+from .hooks import get_dispatcher
+from .links import channel_bucket
 from .models import Sprint, Task
-from .serializers import SprintSerializer, TaskSerializer, UserSerializer
+from .renderers import FastJSONRenderer
+from .search import FullTextSearchFilter
+from .serializers import SprintSerializer, TaskBulkSerializer, TaskSerializer, UserSerializer
 
 # Create your views here.
 
@@ -60,6 +82,151 @@ class StandardResultsSetPagination(PageNumberPagination):
     max_page_size = 100
 
 
+class KeysetPagination(CursorPagination):
+    """
+    Keyset pagination, stable under any ordering with ``id`` as tie-breaker.
+
+    The cursor holds the ordering values of the last (or first) row of the
+    page, the next page is fetched with a ``WHERE`` on those values instead
+    of an ``OFFSET`` and no ``COUNT(*)`` is made. Nullable fields sort nulls
+    first in ascending order so positions compare the same on every database.
+    """
+    page_size = 25
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    tie_breaker = 'id'
+
+    def get_ordering(self, request, queryset, view):
+        ordering = None
+        for backend in getattr(view, 'filter_backends', ()):
+            if hasattr(backend, 'get_ordering'):
+                ordering = backend().get_ordering(request, queryset, view)
+                break
+        ordering = list(ordering or queryset.query.order_by or queryset.model._meta.ordering)
+        names = [field.lstrip('-') for field in ordering]
+        if self.tie_breaker not in names and 'pk' not in names:
+            ordering.append(self.tie_breaker)
+        return tuple(ordering)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.request = request
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.model = queryset.model
+        position, reverse = self.decode_cursor(request)
+
+        # Walking backwards reverses every term, nulls first becomes nulls last.
+        terms = [(field.lstrip('-'), field.startswith('-') != reverse) for field in self.ordering]
+        queryset = queryset.order_by(*[self._order_by(name, desc) for name, desc in terms])
+        if position is not None:
+            queryset = queryset.filter(self._after(terms, position))
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+        return self.page
+
+    def _nullable(self, name):
+        return self.model._meta.get_field(name).null
+
+    def _order_by(self, name, desc):
+        if not self._nullable(name):
+            return F(name).desc() if desc else F(name).asc()
+        return F(name).desc(nulls_last=True) if desc else F(name).asc(nulls_first=True)
+
+    def _after(self, terms, position):
+        """Condition matching the rows sorted after ``position``."""
+        clauses, equal = [], Q()
+        for (name, desc), value in zip(terms, position):
+            if value is None:
+                # Nulls sort first ascending and last descending.
+                after = None if desc else Q(**{f'{name}__isnull': False})
+                same = Q(**{f'{name}__isnull': True})
+            else:
+                after = Q(**{f'{name}__lt' if desc else f'{name}__gt': value})
+                if desc and self._nullable(name):
+                    after |= Q(**{f'{name}__isnull': True})
+                same = Q(**{name: value})
+            if after is not None:
+                clauses.append(equal & after)
+            equal &= same
+        if not clauses:
+            return Q(pk__in=[])
+        return reduce(operator.or_, clauses)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            cursor = json.loads(urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+            if cursor['o'] != list(self.ordering) or len(cursor['p']) != len(self.ordering):
+                raise ValueError
+            position = [
+                None if value is None else self.model._meta.get_field(field.lstrip('-')).to_python(value)
+                for field, value in zip(self.ordering, cursor['p'])
+            ]
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+        return position, bool(cursor.get('r'))
+
+    def encode_cursor(self, obj, reverse=False):
+        if isinstance(obj, dict):
+            # A .values() row of ValuesListMixin
+            position = [obj[field.lstrip('-')] for field in self.ordering]
+        else:
+            position = [getattr(obj, field.lstrip('-')) for field in self.ordering]
+        cursor = {'o': list(self.ordering), 'p': position}
+        if reverse:
+            cursor['r'] = 1
+        encoded = urlsafe_b64encode(json.dumps(cursor, cls=DjangoJSONEncoder).encode('utf-8'))
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded.decode('ascii'))
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1])
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+
+class KeysetPaginationMixin(object):
+    """
+    Opt-in keyset pagination, used when the ``cursor`` query parameter is
+    present. Request the first page with an empty ``?cursor=``.
+    """
+
+    keyset_pagination_class = KeysetPagination
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            if self.keyset_pagination_class.cursor_query_param in self.request.query_params:
+                self._paginator = self.keyset_pagination_class()
+            else:
+                self._paginator = super().paginator
+        return self._paginator
+
+
 class DefaultsMixin(object):
     """
     Default settings for view authentication, permissions,
@@ -67,8 +234,8 @@ class DefaultsMixin(object):
     """
 
     authentication_classes = (
-        authentication.BasicAuthentication,
-        authentication.TokenAuthentication,
+        CachedBasicAuthentication,
+        CachedTokenAuthentication,
         # authentication.SessionAuthentication,
     )
     permission_classes = (
@@ -76,97 +243,245 @@ class DefaultsMixin(object):
     )
     pagination_class = StandardResultsSetPagination
     filter_backends = (
-        filters.SearchFilter,
+        FullTextSearchFilter,
         filters.OrderingFilter,
         DjangoFilterBackend,
     )
 
 
+class ValuesListMixin(object):
+    """
+    List through the ``values_fields`` and ``to_row_representation()`` of the
+    serializer and render with FastJSONRenderer.
+
+    Rows are read with ``.values()`` and represented as plain dicts, skipping
+    model instances and the serializer fields. The response is the same as
+    the one built by ListModelMixin.
+    """
+
+    renderer_classes = (FastJSONRenderer, BrowsableAPIRenderer)
+
+    def list(self, request, *args, **kwargs):
+        serializer = self.get_serializer()
+        queryset = self.filter_queryset(self.get_queryset()).values(*serializer.values_fields)
+        page = self.paginate_queryset(queryset)
+        rows = queryset if page is None else page
+        data = [serializer.to_row_representation(row) for row in rows]
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
+
+
+class ConditionalGetMixin(object):
+    """
+    Answer list and detail requests with 304 when nothing changed.
+
+    Validators are derived from the version stamps of ``version_collections``
+    without touching the database, so revalidating costs no row fetch. The
+    stamps must be shared by every process, conditional requests are only
+    answered when BOARD_CONDITIONAL_GET is set.
+    """
+
+    version_collections = ()
+
+    def get_etag_extra(self):
+        """Anything else the representation depends on."""
+        return ''
+
+    def get_last_modified(self, versions):
+        return max(versions)
+
+    def get_validators(self, request):
+        versions = get_versions(*self.version_collections)
+        key = ':'.join([repr(version) for version in versions] + [
+            request.get_host(), request.get_full_path(),
+            request.accepted_media_type, self.get_etag_extra(),
+        ])
+        etag = '"%s"' % hashlib.md5(key.encode('utf-8')).hexdigest()
+        return etag, int(self.get_last_modified(versions))
+
+    def conditional_response(self, handler, request, *args, **kwargs):
+        if not settings.BOARD_CONDITIONAL_GET:
+            return handler(request, *args, **kwargs)
+        etag, last_modified = self.get_validators(request)
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = handler(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(last_modified)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(super().retrieve, request, *args, **kwargs)
+
+
+class TaskListCacheMixin(object):
+    """
+    Serve task lists from the response cache when BOARD_TASK_LIST_CACHE is set.
+
+    Lists filtered on a sprint or on the backlog are cached in a scope of
+    their own. The task signals only invalidate the scopes of the sprints the
+    task belonged to before and after a write and the unfiltered lists.
+    """
+
+    truthy = ('true', '1')
+
+    def get_cache_scope(self, request):
+        sprints = [value for value in request.query_params.getlist('sprint') if value]
+        if len(sprints) == 1 and sprints[0].isdigit():
+            return task_list_scope(int(sprints[0]))
+        if request.query_params.get('backlog', '').lower() in self.truthy:
+            return task_list_scope(None)
+        return 'all'
+
+    def list(self, request, *args, **kwargs):
+        if not settings.BOARD_TASK_LIST_CACHE:
+            return super().list(request, *args, **kwargs)
+        key = task_list_cache.get_key(self.get_cache_scope(request), request)
+        data = task_list_cache.get(key)
+        if data is not None:
+            return Response(data)
+        response = super().list(request, *args, **kwargs)
+        if response.status_code == 200:
+            task_list_cache.set(key, response.data)
+        return response
+
+
 class UpdateHookMixin(object):
     """Mixin class to send update information to the websocket server."""
 
+    hook_actions = {
+        'POST': 'add',
+        'PUT': 'update',
+        'DELETE': 'remove',
+    }
+
     @staticmethod
-    def _build_hook_url(obj):
+    def _hook_model(obj):
         if isinstance(obj, User):
-            model = 'user'
-        else:
-            model = obj.__class__.__name__.lower()
-
-        proto = 'https' if settings.WATERCOOLER_SECURE else 'http'
-        host = settings.WATERCOOLER_SERVER
-        return f"{proto}://{host}/{model}/{obj.pk}"
-
-    def _send_hook_request(self, obj, method):
-        url = self._build_hook_url(obj)
-        if method in ('POST', 'PUT'):
-            # Build the body
-            serializer = self.get_serializer(obj)
-            renderer = JSONRenderer()
+            return 'user'
+        return obj.__class__.__name__.lower()
+
+    @staticmethod
+    def _hook_sprints(obj, *previous):
+        """Sprints whose boards show a task, before and after the change."""
+        if not isinstance(obj, Task):
+            return None
+        return list(dict.fromkeys(previous + (obj.sprint_id,)))
+
+    def _send_hook_request(self, obj, method, *previous_sprints):
+        data = self.get_serializer(obj).data if method in ('POST', 'PUT') else None
+        sprints = self._hook_sprints(obj, *previous_sprints)
+        self._queue_hook(self._hook_model(obj), obj.pk, self.hook_actions[method], data, sprints)
+
+    def _queue_hook(self, model, pk, action, data=None, sprints=None):
+        if data is not None:
+            # Build the body while the request is still available,
+            # delivery happens later on the dispatcher's worker threads.
+            renderer = FastJSONRenderer()
             context = dict(request=self.request)
-            body = renderer.render(serializer.data, renderer_context=context)
+            body = renderer.render(data, renderer_context=context)
         else:
             body = None
-        headers = {
-            'content-type': 'application/json',
-            'X-Signature': self._build_hook_signature(method, url, body)
-        }
-        try:
-            response = requests.request(method, url, data=body, headers=headers, timeout=0.5)
-            response.raise_for_status()
-        except requests.exceptions.ConnectionError:
-            # Host could not be resolved or the connection was refused
-            pass
-        except requests.exceptions.Timeout:
-            # Request timed out
-            pass
-        except requests.exceptions.RequestException:
-            # Server response with 4XX or 5XX status code
-            pass
-
-    @staticmethod
-    def _build_hook_signature(method, url, body):
-        signer = TimestampSigner(settings.WATERCOOLER_SECRET)
-        body = hashlib.sha256(body or b'').hexdigest()
-        value = f"{method.lower()}:{url}:{body}"
-        return signer.sign(value)
+        get_dispatcher().submit(model, pk, action, body, sprints)
 
     def perform_create(self, serializer):
         super().perform_create(serializer)
         self._send_hook_request(serializer.instance, 'POST')
 
     def perform_update(self, serializer):
+        previous = getattr(serializer.instance, 'sprint_id', None)
         super().perform_update(serializer)
-        self._send_hook_request(serializer.instance, 'PUT')
+        self._send_hook_request(serializer.instance, 'PUT', previous)
 
     def perform_destroy(self, instance):
         self._send_hook_request(instance, 'DELETE')
         super().perform_destroy(instance)
 
 
-class SprintViewSet(DefaultsMixin, UpdateHookMixin, viewsets.ModelViewSet):
+class SprintViewSet(DefaultsMixin, KeysetPaginationMixin, ConditionalGetMixin, UpdateHookMixin,
+                    ValuesListMixin, viewsets.ModelViewSet):
     """API endpoint for listing and creating sprints."""
 
+    version_collections = ('sprint',)
+
     queryset = Sprint.objects.order_by('end')
     serializer_class = SprintSerializer
     filter_class = SprintFilter
     search_fields = ('name',)
     ordering_fields = ('end', 'name', )
 
+    def get_etag_extra(self):
+        # The signed channel links change with every refresh period
+        return str(channel_bucket())
 
-class TaskViewSet(DefaultsMixin, UpdateHookMixin, viewsets.ModelViewSet):
+    def get_last_modified(self, versions):
+        return max(super().get_last_modified(versions), channel_bucket())
+
+
+class TaskViewSet(DefaultsMixin, KeysetPaginationMixin, ConditionalGetMixin, UpdateHookMixin,
+                  TaskListCacheMixin, ValuesListMixin, viewsets.ModelViewSet):
     """API endpoint for listing and creating tasks."""
 
-    queryset = Task.objects.all()
+    version_collections = ('task', 'user',)
+
+    queryset = Task.objects.select_related('assigned')
     serializer_class = TaskSerializer
     filter_class = TaskFilter
     search_fields = ('name', 'description',)
     ordering_fields = ('name', 'order', 'started', 'due', 'completed',)
 
-
-class UserViewSet(DefaultsMixin, UpdateHookMixin, viewsets.ReadOnlyModelViewSet):
+    @action(detail=False, methods=['patch'])
+    def bulk(self, request):
+        """
+        Apply a list of partial task updates in one transaction, e.g.
+        ``[{"id": 1, "status": 2, "order": 0}, {"id": 2, "order": 1}]``.
+        """
+        serializer = TaskBulkSerializer(
+            self.get_queryset(), data=request.data, many=True,
+            context=self.get_serializer_context(),
+        )
+        serializer.is_valid(raise_exception=True)
+        tasks = serializer.save()
+        # bulk_update() sends no model signals
+        bump_versions('task')
+        previous = serializer.previous_sprints
+        invalidate_task_lists(*previous.values(), *(task.sprint_id for task in tasks))
+        data = self.get_serializer(tasks, many=True).data
+        # Queued together, the updates are delivered as a single batch.
+        for task, item in zip(tasks, data):
+            self._queue_hook('task', task.pk, 'update', item, self._hook_sprints(task, previous[task.pk]))
+        return Response(data)
+
+
+class UserViewSet(DefaultsMixin, ConditionalGetMixin, UpdateHookMixin, ValuesListMixin,
+                  viewsets.ReadOnlyModelViewSet):
     """API endpoint for listing users."""
 
+    version_collections = ('user',)
+
     lookup_field = User.USERNAME_FIELD
     queryset = User.objects.order_by(User.USERNAME_FIELD)
     serializer_class = UserSerializer
     search_fields = (User.USERNAME_FIELD,)
+
+
+class StatsView(DefaultsMixin, APIView):
+    """Runtime counters of this API process."""
+
+    permission_classes = (
+        permissions.IsAdminUser,
+    )
+
+    def get(self, request, format=None):
+        return Response({
+            'hooks': get_dispatcher().stats(),
+            'task_list_cache': task_list_cache.stats(),
+            'basic_auth_cache': credentials_cache.stats(),
+            'token_auth_cache': token_cache.stats(),
+            'database': db.stats(),
+        })
@@ -86,9 +86,87 @@ DATABASES = {
         'NAME': 'scrum',
         'USER': 'root',
         'PASSWORD': 'mysql',
+        # Seconds a connection is reused across requests, 0 closes it after each
+        # request. The threaded runserver opens one per request thread anyway.
+        'CONN_MAX_AGE': int(os.environ.get('DATABASE_CONN_MAX_AGE', 60)),
     }
 }
 
+# Ping reused connections idle for BOARD_DB_HEALTH_CHECK_IDLE seconds when a
+# request starts and reconnect if the server dropped them.
+BOARD_DB_HEALTH_CHECKS = os.environ.get('BOARD_DB_HEALTH_CHECKS', '1') == '1'
+
+BOARD_DB_HEALTH_CHECK_IDLE = float(os.environ.get('BOARD_DB_HEALTH_CHECK_IDLE', 10))
+
+# Report the connection setup and query time of each request in a Server-Timing header.
+BOARD_DB_TIMING = bool(os.environ.get('BOARD_DB_TIMING', ''))
+
+if BOARD_DB_TIMING:
+    MIDDLEWARE.insert(0, 'board.db.DatabaseTimingMiddleware')
+
+
+# Cache
+# https://docs.djangoproject.com/en/2.2/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'default',
+    },
+    # Rendered API list responses, MAX_ENTRIES bounds its memory.
+    'responses': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'responses',
+        'TIMEOUT': 60 * 5,
+        'OPTIONS': {
+            'MAX_ENTRIES': 1000,
+        },
+    },
+}
+
+# Share the caches between processes through Redis (requires django-redis).
+REDIS_CACHE_URL = os.environ.get('REDIS_CACHE_URL', '')
+
+if REDIS_CACHE_URL:
+    for alias, config in CACHES.items():
+        CACHES[alias] = {
+            'BACKEND': 'django_redis.cache.RedisCache',
+            'LOCATION': REDIS_CACHE_URL,
+            'KEY_PREFIX': alias,
+            'TIMEOUT': config.get('TIMEOUT', 60 * 5),
+        }
+
+BOARD_RESPONSE_CACHE = 'responses'
+
+# Answer conditional API requests from the version stamps in the default
+# cache. Process-local caches would let other processes answer 304 for
+# changed data, so it is only on by default with the Redis caches. Set it
+# when the API runs in a single process.
+BOARD_CONDITIONAL_GET = bool(REDIS_CACHE_URL or os.environ.get('BOARD_CONDITIONAL_GET', ''))
+
+# Serve task lists from the BOARD_RESPONSE_CACHE cache, invalidated through
+# version stamps in the default cache. Like BOARD_CONDITIONAL_GET it is only
+# on by default with the Redis caches, set it when the API runs in a single
+# process.
+BOARD_TASK_LIST_CACHE = bool(REDIS_CACHE_URL or os.environ.get('BOARD_TASK_LIST_CACHE', ''))
+
+# Successful Basic authentications are remembered for BOARD_AUTH_CACHE_TTL
+# seconds in each process, instead of hashing the password on every request.
+BOARD_AUTH_CACHE_SIZE = int(os.environ.get('BOARD_AUTH_CACHE_SIZE', 1024))
+
+BOARD_AUTH_CACHE_TTL = int(os.environ.get('BOARD_AUTH_CACHE_TTL', 60))
+
+# The users of resolved API tokens are kept in each process for
+# BOARD_TOKEN_CACHE_LOCAL_TTL seconds and, when BOARD_TOKEN_CACHE names a
+# cache alias, their primary keys in that cache for BOARD_TOKEN_CACHE_TTL seconds.
+BOARD_TOKEN_CACHE_SIZE = int(os.environ.get('BOARD_TOKEN_CACHE_SIZE', 1024))
+
+BOARD_TOKEN_CACHE_LOCAL_TTL = int(os.environ.get('BOARD_TOKEN_CACHE_LOCAL_TTL', 5))
+
+BOARD_TOKEN_CACHE_TTL = int(os.environ.get('BOARD_TOKEN_CACHE_TTL', 60 * 5))
+
+BOARD_TOKEN_CACHE = os.environ.get('BOARD_TOKEN_CACHE', '') or None
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.1/ref/settings/#auth-password-validators
@@ -135,4 +213,34 @@ WATERCOOLER_SERVER = os.environ.get('WATERCOOLER_SERVER', 'localhost:8080')
 
 WATERCOOLER_SECURE = bool(os.environ.get('WATERCOOLER_SECURE', ''))
 
-WATERCOOLER_SECRET = os.environ.get('WATERCOOLER_SECRET', SECRET_KEY)
\ No newline at end of file
+WATERCOOLER_SECRET = os.environ.get('WATERCOOLER_SECRET', SECRET_KEY)
+
+# Seconds a signed sprint channel is reused before a new one is issued,
+# the websocket server accepts channels for 30 minutes.
+WATERCOOLER_CHANNEL_REFRESH = int(os.environ.get('WATERCOOLER_CHANNEL_REFRESH', 60 * 5))
+
+# Keep-alive connection pool used to send hooks to the websocket server.
+
+WATERCOOLER_HOOK_POOL_SIZE = int(os.environ.get('WATERCOOLER_HOOK_POOL_SIZE', 1))
+
+WATERCOOLER_HOOK_TIMEOUT = float(os.environ.get('WATERCOOLER_HOOK_TIMEOUT', 0.5))
+
+# Retries with exponential backoff, only for idempotent PUT and DELETE requests.
+WATERCOOLER_HOOK_RETRIES = int(os.environ.get('WATERCOOLER_HOOK_RETRIES', 2))
+
+WATERCOOLER_HOOK_BACKOFF = float(os.environ.get('WATERCOOLER_HOOK_BACKOFF', 0.1))
+
+# Stop sending hooks for WATERCOOLER_HOOK_COOLDOWN seconds after
+# WATERCOOLER_HOOK_FAILURE_THRESHOLD consecutive failures.
+WATERCOOLER_HOOK_FAILURE_THRESHOLD = int(os.environ.get('WATERCOOLER_HOOK_FAILURE_THRESHOLD', 5))
+
+WATERCOOLER_HOOK_COOLDOWN = float(os.environ.get('WATERCOOLER_HOOK_COOLDOWN', 30))
+
+# Update hooks are queued and sent to the websocket server in batches,
+# one batch at a time from a background thread.
+WATERCOOLER_HOOK_QUEUE_SIZE = int(os.environ.get('WATERCOOLER_HOOK_QUEUE_SIZE', 1000))
+
+# Seconds to wait for more events before a batch is sent.
+WATERCOOLER_HOOK_BATCH_WINDOW = float(os.environ.get('WATERCOOLER_HOOK_BATCH_WINDOW', 0.05))
+
+WATERCOOLER_HOOK_BATCH_SIZE = int(os.environ.get('WATERCOOLER_HOOK_BATCH_SIZE', 100))
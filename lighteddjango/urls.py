@@ -19,10 +19,12 @@ from django.views.generic import TemplateView
 
 from rest_framework.authtoken.views import obtain_auth_token
 from board.urls import router
+from board.views import StatsView
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     re_path(r'^api/token/', obtain_auth_token, name='api-token'),
+    re_path(r'^api/stats$', StatsView.as_view(), name='api-stats'),
     re_path(r'^api/', include(router.urls)),
     re_path(r'^$', TemplateView.as_view(template_name='board/index.html')),
 ]
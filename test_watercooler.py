@@ -0,0 +1,189 @@
+import hashlib
+import json
+from urllib.parse import urlencode
+
+from tornado import gen
+from tornado.options import options
+from tornado.testing import AsyncHTTPTestCase, AsyncTestCase, gen_test
+from tornado.websocket import websocket_connect
+
+from watercooler import SUBSCRIBED, Publisher, ScrumApplication
+
+
+class WatercoolerTestCase(AsyncHTTPTestCase):
+    """A single worker on the in-process bus, with board clients and signed hooks."""
+
+    settings = {'backend': 'memory'}
+
+    def setUp(self):
+        self.saved = {name: getattr(options, name) for name in self.settings}
+        for name, value in self.settings.items():
+            setattr(options, name, value)
+        super().setUp()
+
+    def tearDown(self):
+        super().tearDown()
+        for name, value in self.saved.items():
+            setattr(options, name, value)
+
+    def get_app(self):
+        self.application = ScrumApplication()
+        return self.application
+
+    @gen.coroutine
+    def connect(self, sprint=1, **params):
+        params['channel'] = self.application.signer.sign(str(sprint))
+        url = self.get_url('/socket?' + urlencode(params)).replace('http', 'ws', 1)
+        client = yield websocket_connect(url)
+        message = yield client.read_message()
+        self.assertEqual(message, SUBSCRIBED)
+        return client
+
+    def publish(self, *events):
+        """Send model events as the Django application does."""
+        url = self.get_url('/batch')
+        body = json.dumps(events).encode('utf-8')
+        signature = self.application.signer.sign(f"put:{url}:{hashlib.sha256(body).hexdigest()}")
+        return self.http_client.fetch(url, method='PUT', body=body, headers={'X-Signature': signature})
+
+    def update(self, pk, sprints=None, **body):
+        body.setdefault('sprint', sprints[-1])
+        return self.publish({'model': 'task', 'id': pk, 'action': 'update', 'body': body, 'sprints': sprints})
+
+
+class DiffTestCase(WatercoolerTestCase):
+
+    @gen.coroutine
+    def read(self, client):
+        message = yield client.read_message()
+        return json.loads(message)[:4]
+
+    @gen_test
+    def test_diff(self):
+        client = yield self.connect(format='compact', diffs='1')
+        yield self.update(1, sprints=[1], name='Task', status=1)
+        self.assertEqual((yield self.read(client)), ['task', '1', 'u', {'name': 'Task', 'status': 1, 'sprint': 1}])
+        yield self.update(1, sprints=[1], name='Task', status=2)
+        self.assertEqual((yield self.read(client)), ['task', '1', 'd', {'status': 2}])
+
+    @gen_test
+    def test_moved_through_backlog(self):
+        """Updates on ``all`` reach the clients of the sprint, its diffs start over."""
+        client = yield self.connect(format='compact', diffs='1')
+        yield self.update(1, sprints=[1], status=2)
+        self.assertEqual((yield self.read(client)), ['task', '1', 'u', {'status': 2, 'sprint': 1}])
+        yield self.update(1, sprints=[1, None], status=1)
+        self.assertEqual((yield self.read(client)), ['task', '1', 'u', {'status': 1, 'sprint': None}])
+        yield self.update(1, sprints=[None, 1], status=1)
+        self.assertEqual((yield self.read(client)), ['task', '1', 'd', {'sprint': 1}])
+        yield self.update(1, sprints=[1], status=2)
+        self.assertEqual((yield self.read(client)), ['task', '1', 'u', {'status': 2, 'sprint': 1}])
+
+    @gen_test
+    def test_removed(self):
+        client = yield self.connect(format='compact', diffs='1')
+        yield self.update(1, sprints=[1], status=1)
+        yield self.read(client)
+        yield self.publish({'model': 'task', 'id': 1, 'action': 'remove', 'body': None, 'sprints': [None]})
+        self.assertEqual((yield self.read(client)), ['task', '1', 'r', None])
+        yield self.update(1, sprints=[1], status=1)
+        self.assertEqual((yield self.read(client)), ['task', '1', 'u', {'status': 1, 'sprint': 1}])
+
+
+class ReplayTestCase(WatercoolerTestCase):
+    """Reconnecting clients get the events they missed, or are told to load everything again."""
+
+    settings = {'backend': 'memory', 'replay_size': 3}
+
+    @gen.coroutine
+    def read(self, client):
+        message = yield client.read_message()
+        return json.loads(message)
+
+    @gen.coroutine
+    def disconnect(self):
+        """Seq of the last event a client got before it went away."""
+        client = yield self.connect()
+        yield self.update(1, sprints=[1], status=1)
+        seq = (yield self.read(client))['seq']
+        client.close()
+        return seq
+
+    @gen_test
+    def test_missed_events(self):
+        seq = yield self.disconnect()
+        yield self.update(1, sprints=[1], status=2)
+        yield self.update(2, sprints=[2], status=2)
+        yield self.update(3, sprints=[None], status=2)
+        client = yield self.connect(since=seq)
+        self.assertEqual((yield self.read(client))['id'], '1')
+        self.assertEqual((yield self.read(client))['id'], '3')
+        yield self.update(4, sprints=[1], status=1)
+        self.assertEqual((yield self.read(client))['id'], '4')
+
+    @gen_test
+    def test_gap(self):
+        seq = yield self.disconnect()
+        for status in range(4):
+            yield self.update(1, sprints=[1], status=status)
+        client = yield self.connect(since=seq)
+        self.assertEqual((yield self.read(client)), {'action': 'resync'})
+
+    @gen_test
+    def test_stale_epoch(self):
+        yield self.disconnect()
+        client = yield self.connect(since='00000000-1')
+        self.assertEqual((yield self.read(client)), {'action': 'resync'})
+
+
+class SlowClientTestCase(WatercoolerTestCase):
+    """Messages are queued for clients which do not read, until too many are."""
+
+    # Nothing is written to the socket, everything is queued
+    settings = {'backend': 'memory', 'client_buffer': 0, 'client_queue': 2}
+
+    @gen_test
+    def test_coalesced(self):
+        client = yield self.connect()
+        for status in range(3):
+            yield self.update(1, sprints=[1], status=status)
+        self.assertEqual(self.application.client_stats['coalesced'], 2)
+        self.assertIsNone(client.close_code)
+
+    @gen_test
+    def test_evicted(self):
+        client = yield self.connect()
+        with self.assertLogs(level='WARNING'):
+            for pk in range(3):
+                yield self.update(pk, sprints=[1], status=1)
+        self.assertIsNone((yield client.read_message()))
+        self.assertEqual(client.close_code, 1008)
+        self.assertEqual(self.application.client_stats['evicted'], 1)
+
+
+class RecordingBackend(object):
+    """Bus recording the published batches."""
+
+    def __init__(self):
+        self.batches = []
+
+    @gen.coroutine
+    def publish(self, messages):
+        self.batches.append(messages)
+        return 0
+
+
+class PublisherTestCase(AsyncTestCase):
+
+    @gen_test
+    def test_coalesce(self):
+        backend = RecordingBackend()
+        publisher = Publisher(backend)
+        publisher.publish('1', 'first', key='task/1')
+        publisher.publish('1', 'added', replay=True)
+        publisher.publish('1', 'second', key='task/1')
+        yield gen.moment
+        self.assertEqual([message for batch in backend.batches for _, _, _, message, _ in batch],
+                         ['added', 'second'])
+        self.assertEqual(publisher.stats()['coalesced'], 1)
+
@@ -1,60 +1,701 @@
 # coding=utf-8
 
 import hashlib
+import hmac
 import json
 import logging
 import os
 import signal
+import socket
+import sys
 import time
 import uuid
 
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from collections import Counter, OrderedDict, deque
 from typing import Union, Optional, Awaitable
 from urllib.parse import urlparse
 
-from django.core.signing import TimestampSigner, BadSignature, SignatureExpired
+from django.core.signing import Signer, TimestampSigner, BadSignature, SignatureExpired, b64_encode
+from django.utils import baseconv
 from django.utils.crypto import constant_time_compare
-from redis import Redis
+from django.utils.encoding import force_bytes
+from tornado import gen, locks
 from tornado.httpserver import HTTPServer
 from tornado.ioloop import IOLoop
+from tornado.netutil import bind_sockets
 from tornado.options import define, parse_command_line, options
+from tornado.process import cpu_count
 from tornado.web import Application, RequestHandler, HTTPError
 from tornado.websocket import WebSocketHandler, WebSocketClosedError
 from tornadoredis import Client
-from tornadoredis.pubsub import BaseSubscriber
 
 define('debug', default=False, type=bool, help='Run in debug mode')
 define('port', default=8080, type=int, help='Server port')
+define('processes', default=1, type=int,
+       help='Number of worker processes, 0 starts one per CPU')
+define('reuse_port', default=hasattr(socket, 'SO_REUSEPORT'), type=bool,
+       help='Let each worker listen on its own SO_REUSEPORT socket instead of sharing one')
+define('deflate', default=True, type=bool,
+       help='Offer permessage-deflate compression to websocket clients')
+define('diffs', default=True, type=bool,
+       help='Send the changed fields of updates to clients asking for them')
+define('diff_cache', default=1000, type=int,
+       help='Number of object bodies kept per channel to compute update diffs')
+define('replay_size', default=500, type=int,
+       help='Number of recent model events kept per channel for reconnecting clients')
+define('token_cache', default=10000, type=int,
+       help='Number of verified channel tokens remembered')
+define('shutdown_timeout', default=5.0, type=float,
+       help='Seconds given to a worker to flush its messages when stopping')
 define('allowed_hosts', default="localhost:8080", multiple=True,
        help='Allowed hosts for cross domain connections')
+define('routing', default='sprint', type=str,
+       help='Publish model updates to the channels of the sprints they belong to (sprint) '
+            'or to every connected client (all)')
+define('backend', default='redis', type=str,
+       help='Message bus between the sockets: Redis pub/sub (redis), or in-process (memory) '
+            'for a single process without Redis')
+define('publish_queue', default=10000, type=int,
+       help='Maximum number of messages waiting to be published to Redis')
+define('publish_batch', default=500, type=int,
+       help='Maximum number of messages published in one Redis pipeline')
+define('backpressure', default='coalesce', type=str,
+       help='When the publish queue is full, drop new messages (drop) or replace the '
+            'queued updates of the same object first (coalesce)')
+define('client_buffer', default=256 * 1024, type=int,
+       help='Bytes buffered for a websocket before messages are queued instead of written')
+define('client_queue', default=500, type=int,
+       help='Maximum number of messages queued for a websocket before it is disconnected')
+define('client_timeout', default=30.0, type=float,
+       help='Seconds a websocket may keep messages queued before it is disconnected')
+
+
+def encode_envelope(message, sender=None, key=None, seq=None):
+    """Prefix a message with the uid of the socket that sent it, its coalescing key and sequence id."""
+    if isinstance(message, bytes):
+        message = message.decode('utf-8')
+    return f"{sender or ''}:{key or ''}:{seq or ''}:{message}"
+
+
+def decode_envelope(body):
+    """Split a published message into its sender, key, sequence id and message."""
+    if body.startswith('{'):
+        # Published by an older node as a JSON envelope
+        try:
+            envelope = json.loads(body)
+            return envelope['sender'], None, None, envelope['message']
+        except (ValueError, KeyError):
+            return None, None, None, body
+    sender, key, seq, message = body.split(':', 3)
+    return sender or None, key or None, seq or None, message
+
+
+def parse_seq(seq):
+    """Split a sequence id in the epoch of the bus and the number of the event."""
+    epoch, _, number = (seq or '').rpartition('-')
+    try:
+        return epoch, int(number)
+    except ValueError:
+        return None, None
+
+
+def select_missed(entries, trimmed, since):
+    """
+    Events of a replay buffer numbered after ``since``.
+
+    Returns None when the buffer already dropped some of them, the client
+    then has to load everything again.
+    """
+    if since < trimmed:
+        return None
+    return [(number, message) for number, message in entries if number > since]
+
+
+# Sent instead of the missed events when they are no longer buffered
+RESYNC = '{"action": "resync"}'
+
+# Sent first once the client is subscribed to its sprint
+SUBSCRIBED = '{"action": "subscribed"}'
+
+# Close code of sockets opened with a missing, forged or expired channel token,
+# clients have to fetch a fresh one instead of reconnecting with it
+INVALID_CHANNEL = 4001
+
+
+# Compact encoding of the model actions, a diff is an update of some fields
+COMPACT_ACTIONS = {'add': 'a', 'update': 'u', 'remove': 'r', 'diff': 'd'}
+
+
+def diff_body(previous, body):
+    """Fields of ``body`` changed since ``previous``, None when they cannot be compared."""
+    if not isinstance(previous, dict) or not isinstance(body, dict) or body.keys() != previous.keys():
+        return None
+    return {name: value for name, value in body.items() if previous[name] != value}
+
+
+class Event(object):
+    """
+    A message of the bus, encoded once for every wire format it is sent in.
+
+    ``json`` is the message as published, ``compact`` is a JSON array of the
+    model, id, action and body of the event, and ``diff`` the same array
+    with only the changed fields of an update as body.
+    """
+
+    __slots__ = ('message', 'seq', 'diff', '_data', '_encoded')
+
+    def __init__(self, message, seq=None):
+        self.message = message
+        self.seq = seq
+        self.diff = None
+        self._data = False
+        self._encoded = {}
+
+    @property
+    def data(self):
+        """The decoded event, None for messages which are not model events."""
+        if self._data is False:
+            try:
+                data = json.loads(self.message)
+            except ValueError:
+                data = None
+            if not isinstance(data, dict) or 'model' not in data or 'action' not in data:
+                data = None
+            self._data = data
+        return self._data
+
+    def encode(self, format):
+        try:
+            return self._encoded[format]
+        except KeyError:
+            pass
+        if format == 'json':
+            encoded = self.message
+            if self.seq is not None and encoded.startswith('{'):
+                encoded = f'{{"seq": "{self.seq}", {encoded[1:]}'
+            self._encoded[format] = encoded
+            return encoded
+        data = self.data
+        if data is None:
+            encoded = self.message
+        else:
+            if format == 'diff' and self.diff is not None:
+                encoded = [data['model'], data.get('id'), COMPACT_ACTIONS['diff'], self.diff]
+            else:
+                action = COMPACT_ACTIONS.get(data['action'], data['action'])
+                encoded = [data['model'], data.get('id'), action, data.get('body')]
+            if self.seq is not None:
+                encoded.append(self.seq)
+            elif encoded[-1] is None:
+                encoded.pop()
+            encoded = json.dumps(encoded, separators=(',', ':'))
+        self._encoded[format] = encoded
+        return encoded
+
+
+class PrecomputedSigner(TimestampSigner):
+    """
+    TimestampSigner deriving its HMAC key once.
+
+    ``django.core.signing`` derives the key from the salt and secret on every
+    signature, here the keyed HMAC state is prepared once and copied.
+    """
+
+    def __init__(self, key=None, sep=':', salt=None):
+        # Keep the default salt of TimestampSigner to verify Django's signatures.
+        salt = salt or '%s.%s' % (TimestampSigner.__module__, TimestampSigner.__name__)
+        super().__init__(key, sep=sep, salt=salt)
+        key = hashlib.sha1(force_bytes(self.salt + 'signer') + force_bytes(self.key)).digest()
+        self._hmac = hmac.new(key, digestmod=hashlib.sha1)
+
+    def signature(self, value):
+        mac = self._hmac.copy()
+        mac.update(force_bytes(value))
+        return b64_encode(mac.digest()).decode()
+
+
+class TokenCache(object):
+    """
+    Bounded LRU of verified channel tokens and the time they were signed.
 
+    A reconnect storm presents the same few tokens thousands of times, only
+    the first one is checked with HMAC. The age of cached tokens is checked
+    on every use, so they expire exactly as unsign() would expire them.
+    """
 
-class RedisSubscriber(BaseSubscriber):
+    def __init__(self, signer, maxsize=10000):
+        self.signer = signer
+        self.maxsize = maxsize
+        self.tokens = OrderedDict()
+        self.counters = Counter()
+
+    def unsign(self, token, max_age):
+        try:
+            value, timestamp = self.tokens[token]
+        except KeyError:
+            self.counters['misses'] += 1
+            # Raises BadSignature, invalid tokens are never cached
+            value, timestamp = Signer.unsign(self.signer, token).rsplit(self.signer.sep, 1)
+            timestamp = baseconv.base62.decode(timestamp)
+            self.tokens[token] = value, timestamp
+            if len(self.tokens) > self.maxsize:
+                self.tokens.popitem(last=False)
+        else:
+            self.counters['hits'] += 1
+            self.tokens.move_to_end(token)
+        age = time.time() - timestamp
+        if age > max_age:
+            self.tokens.pop(token, None)
+            raise SignatureExpired(f'Signature age {age} > {max_age} seconds')
+        return value
+
+    def stats(self):
+        result = dict(self.counters)
+        result['size'] = len(self.tokens)
+        return result
+
+
+class RedisBackend(object):
+    """
+    Redis pub/sub bus shared by every worker process and node.
+
+    Messages are published with their sender and key in a text envelope. The
+    ``all`` channel stays subscribed without local sockets, holding one open
+    keeps the listen loop of the client running.
+
+    Model events are numbered and kept in a capped list per channel by a Lua
+    script publishing them, so reconnecting clients can get those they missed.
+    The epoch of the numbers changes when Redis loses them.
+    """
+
+    persistent = frozenset(['all'])
+    seq_key = 'watercooler:seq'
+    epoch_key = 'watercooler:epoch'
+    replay_key = 'watercooler:replay:{}'
+    trimmed_key = 'watercooler:trimmed:{}'
+    # Buffers of channels without events for a day are dropped
+    replay_ttl = 24 * 60 * 60
+
+    publish_script = """
+        redis.call('SETNX', KEYS[2], ARGV[2])
+        local epoch = redis.call('GET', KEYS[2])
+        local seq = redis.call('INCR', KEYS[1])
+        redis.call('RPUSH', KEYS[3], seq .. ':' .. ARGV[6])
+        if redis.call('LLEN', KEYS[3]) > tonumber(ARGV[3]) then
+            local dropped = redis.call('LPOP', KEYS[3])
+            redis.call('SET', KEYS[4], string.match(dropped, '^%d+'), 'EX', ARGV[7])
+        end
+        redis.call('EXPIRE', KEYS[3], ARGV[7])
+        redis.call('PUBLISH', ARGV[1], ARGV[4] .. ':' .. ARGV[5] .. ':' .. epoch .. '-' .. seq .. ':' .. ARGV[6])
+        return seq
+    """
+    read_script = """
+        local result = {redis.call('GET', KEYS[1]) or '', redis.call('GET', KEYS[2]) or '0'}
+        for _, entry in ipairs(redis.call('LRANGE', KEYS[3], 0, -1)) do
+            table.insert(result, entry)
+        end
+        return result
+    """
+
+    def __init__(self):
+        self.subscriber = Client()
+        self.publisher = Client()
+        self.reader = Client()
+        self.reading = locks.Lock()
+        self.handler = None
+        self.listening = False
+        # Epoch set when this node publishes the first event on a new Redis
+        self.epoch = uuid.uuid4().hex[:8]
+
+    def start(self, handler):
+        """Deliver the messages of the subscribed channels to ``handler``."""
+        self.handler = handler
+
+    def subscribe(self, channel):
+        if channel in self.persistent and channel in self.subscriber.subscribed:
+            pass
+        elif self.listening:
+            self.subscriber.subscribe(channel)
+        else:
+            self.listening = True
+            self.subscriber.subscribe(channel, callback=self.listen)
+
+    def unsubscribe(self, channel):
+        if channel not in self.persistent:
+            self.subscriber.unsubscribe(channel)
+
+    def listen(self, *args):
+        self.subscriber.listen(self.on_message)
 
     def on_message(self, msg):
         """Handle new message on the Redis channel"""
-        if msg and msg.kind == 'message':
-            try:
-                message = json.loads(msg.body)
-                sender = message['sender']
-                message = message['message']
-            except (ValueError, KeyError):
-                message = msg.body
-                sender = None
-
-            subscribers = list(self.subscribers[msg.channel].keys())
-            for subscriber in subscribers:
-                if sender is None or sender != subscriber.uid:
-                    try:
-                        subscriber.write_message(message)
-                    except WebSocketClosedError:
-                        # Remove dead peer
-                        self.unsubscribe(msg.channel, subscriber)
-        super().on_message(msg)
+        if not msg:
+            return
+        if msg.kind == 'disconnect':
+            # Disconnected from the Redis server
+            logging.error('Lost connection to Redis, closing sockets.')
+            self.listening = False
+            self.handler.on_disconnect()
+        elif msg.kind == 'message':
+            self.handler.on_message(msg.channel, *decode_envelope(msg.body))
+
+    @gen.coroutine
+    def publish(self, messages):
+        """Publish ``(channel, sender, key, message, replay)`` tuples in one pipeline, returns the failures."""
+        pipe = self.publisher.pipeline()
+        for channel, sender, key, message, replay in messages:
+            if replay and options.replay_size:
+                if isinstance(message, bytes):
+                    message = message.decode('utf-8')
+                keys = [self.seq_key, self.epoch_key,
+                        self.replay_key.format(channel), self.trimmed_key.format(channel)]
+                args = [channel, self.epoch, options.replay_size, sender or '', key or '', message,
+                        self.replay_ttl]
+                pipe.eval(self.publish_script, keys, args)
+            else:
+                pipe.publish(channel, encode_envelope(message, sender, key))
+        try:
+            results = yield gen.Task(pipe.execute)
+        except Exception as e:
+            results = [e]
+        errors = [result for result in results if isinstance(result, Exception)]
+        if errors:
+            logging.error('Failed to publish to Redis: %s', errors[0])
+        return len(errors)
+
+    @gen.coroutine
+    def replay(self, channel, epoch, since):
+        """Events of the channel numbered after ``since``, None when some were lost."""
+        keys = [self.epoch_key, self.trimmed_key.format(channel), self.replay_key.format(channel)]
+        with (yield self.reading.acquire()):
+            result = yield gen.Task(self.reader.eval, self.read_script, keys, [])
+        if isinstance(result, Exception):
+            logging.error('Failed to read missed events from Redis: %s', result)
+            return None
+        current, trimmed, entries = result[0], int(result[1]), result[2:]
+        if current != epoch:
+            return None
+        entries = [entry.split(':', 1) for entry in entries]
+        return select_missed([(int(number), message) for number, message in entries], trimmed, since)
+
+
+class MemoryBackend(object):
+    """
+    In-process bus of a single worker.
+
+    Published messages are handed to the local sockets as they are, without
+    an envelope or a round trip to a server. Model events are numbered and
+    kept in a ring per channel for reconnecting clients.
+    """
+
+    def __init__(self):
+        self.handler = None
+        self.channels = set()
+        self.epoch = uuid.uuid4().hex[:8]
+        self.seq = 0
+        self.buffers = {}
+        self.trimmed = Counter()
+
+    def start(self, handler):
+        self.handler = handler
+
+    def subscribe(self, channel):
+        self.channels.add(channel)
+
+    def unsubscribe(self, channel):
+        self.channels.discard(channel)
+
+    @gen.coroutine
+    def publish(self, messages):
+        for channel, sender, key, message, replay in messages:
+            if isinstance(message, bytes):
+                message = message.decode('utf-8')
+            seq = None
+            if replay and options.replay_size:
+                self.seq += 1
+                seq = f'{self.epoch}-{self.seq}'
+                buffer = self.buffers.get(channel)
+                if buffer is None:
+                    buffer = self.buffers[channel] = deque(maxlen=options.replay_size)
+                if len(buffer) == buffer.maxlen:
+                    self.trimmed[channel] = buffer[0][0]
+                buffer.append((self.seq, message))
+            if channel in self.channels:
+                self.handler.on_message(channel, sender, key, seq, message)
+        return 0
+
+    @gen.coroutine
+    def replay(self, channel, epoch, since):
+        if epoch != self.epoch:
+            return None
+        return select_missed(self.buffers.get(channel, ()), self.trimmed[channel], since)
+
+
+backends = {
+    'redis': RedisBackend,
+    'memory': MemoryBackend,
+}
+
+
+class Subscriber(object):
+    """
+    Fan out the messages of the bus to the local websocket connections.
+
+    The node holds a single bus subscription per channel, made when the first
+    local socket joins the channel and dropped when the last one leaves. The
+    sockets of each channel are kept in a tuple that is replaced when sockets
+    join or leave, so a message is delivered without copying the registry.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.backend.start(self)
+        self.channels = {}
+        # Last body of the updated objects, per channel
+        self.bodies = {}
+        # Number of messages written to sockets, per channel
+        self.delivered = Counter()
+
+    def subscribe(self, channel, subscriber):
+        sockets = self.channels.get(channel)
+        if sockets is None:
+            self.channels[channel] = (subscriber,)
+            self.backend.subscribe(channel)
+        elif subscriber not in sockets:
+            self.channels[channel] = sockets + (subscriber,)
+
+    def unsubscribe(self, channel, subscriber):
+        sockets = self.channels.get(channel, ())
+        if subscriber not in sockets:
+            return
+        sockets = tuple(socket for socket in sockets if socket is not subscriber)
+        if sockets:
+            self.channels[channel] = sockets
+        else:
+            del self.channels[channel]
+            # Updates of the channel are missed from now on
+            self.bodies.pop(channel, None)
+            self.backend.unsubscribe(channel)
+
+    def on_disconnect(self):
+        for sockets in list(self.channels.values()):
+            for socket in sockets:
+                socket.close()
+        self.channels = {}
+        self.bodies = {}
+
+    def get_diff(self, channel, key, event):
+        """
+        Diff an update against the previous update of the object on the channel.
+
+        Clients of the channel saw the previous update, or loaded the object
+        afterwards, so the diff brings them up to date.
+        """
+        bodies = self.bodies.setdefault(channel, OrderedDict())
+        body = event.data and event.data.get('body')
+        previous = bodies.pop(key, None)
+        self.forget_body(key, body)
+        if isinstance(body, dict):
+            bodies[key] = body
+            if len(bodies) > options.diff_cache:
+                bodies.popitem(last=False)
+        return diff_body(previous, body)
+
+    def forget_body(self, key, body=None):
+        """
+        Drop the body of an object cached on the channels where it is not ``body``.
+
+        A client gets the events of its sprint channel and of ``all``, a
+        message published on one channel changes the object for the clients
+        of the other channels too, they cannot be diffed against the body
+        cached there any more.
+        """
+        for bodies in self.bodies.values():
+            if key in bodies and bodies[key] != body:
+                del bodies[key]
+
+    def on_message(self, channel, sender, key, seq, message):
+        sockets = self.channels.get(channel, ())
+        event = Event(message, seq)
+        if options.diffs and key is not None:
+            if any(socket.format == 'diff' for socket in sockets):
+                event.diff = self.get_diff(channel, key, event)
+            elif self.bodies:
+                # Not kept up to date, do not diff against it later
+                self.forget_body(key, event.data and event.data.get('body'))
+        elif options.diffs and self.bodies and event.data:
+            # Created or removed, the next update is sent in full
+            self.forget_body(f"{event.data['model']}/{event.data.get('id')}")
+        dead = []
+        delivered = 0
+        for subscriber in sockets:
+            if sender is None or sender != subscriber.uid:
+                try:
+                    subscriber.send(event, key)
+                    delivered += 1
+                except WebSocketClosedError:
+                    dead.append(subscriber)
+        for subscriber in dead:
+            # Remove dead peer
+            self.unsubscribe(channel, subscriber)
+        self.delivered[channel] += delivered
+
+
+class Publisher(object):
+    """
+    Publish messages to the bus without blocking the IOLoop.
+
+    Messages are queued and flushed on the next loop iteration in batches,
+    sent to Redis as a single pipeline of PUBLISH commands, with one batch in
+    flight at a time. In ``coalesce`` mode a message replaces the queued
+    message with the same key, keys name the object a model update is about
+    so only its latest state is published. Once the queue is full new
+    messages are dropped.
+    """
+
+    def __init__(self, backend, max_queue=10000, max_batch=500, backpressure='coalesce'):
+        self.backend = backend
+        self.max_queue = max_queue
+        self.max_batch = max_batch
+        self.backpressure = backpressure
+        self.queue = OrderedDict()
+        self.flushing = False
+        self._seq = 0
+        self.counters = Counter()
+
+    def publish(self, channel, message, sender=None, key=None, replay=False):
+        entry = (channel, sender, key, message, replay)
+        if key is None:
+            # Messages from clients are never superseded
+            self._seq += 1
+            queue_key = self._seq
+        else:
+            queue_key = (channel, key)
+            if queue_key in self.queue and self.backpressure == 'coalesce':
+                # Publish after whatever was queued about the object meanwhile
+                del self.queue[queue_key]
+                self.queue[queue_key] = entry
+                self.counters['coalesced'] += 1
+                return True
+        if len(self.queue) >= self.max_queue:
+            self.counters['dropped'] += 1
+            logging.warning('Publish queue is full, dropped a message to %s.', channel)
+            return False
+        self.queue[queue_key] = entry
+        self.counters['queued'] += 1
+        if not self.flushing:
+            self.flushing = True
+            IOLoop.current().add_callback(self.flush)
+        return True
+
+    @gen.coroutine
+    def flush(self):
+        try:
+            while self.queue:
+                count = min(self.max_batch, len(self.queue))
+                batch = [self.queue.popitem(last=False)[1] for _ in range(count)]
+                errors = yield self.backend.publish(batch)
+                self.counters['batches'] += 1
+                self.counters['published'] += count - errors
+                self.counters['failed'] += errors
+        finally:
+            self.flushing = False
+
+    def stats(self):
+        result = dict(self.counters)
+        result['depth'] = len(self.queue)
+        return result
 
 
 class SprintHandler(WebSocketHandler):
     """Handlers real-time updates to the board."""
 
+    # Seconds between attempts to write queued messages
+    drain_interval = 0.05
+
+    def initialize(self):
+        # Messages waiting for the client to read what was already written
+        self.outbox = OrderedDict()
+        self.backlogged = None
+        self.evicted = False
+        self.format = 'json'
+        # Live events held while the missed ones are being sent
+        self.pending = None
+        self._seq = 0
+
+    @property
+    def buffered(self):
+        """Bytes written to the socket but not yet sent to the client."""
+        stream = getattr(self.ws_connection, 'stream', None)
+        return getattr(stream, '_write_buffer_size', 0)
+
+    def send(self, event, key=None):
+        """
+        Write an event to the client, or queue it while the client is slow.
+
+        A queued update replaces the queued update of the same object. Clients
+        queuing more than ``client_queue`` messages or for longer than
+        ``client_timeout`` seconds are disconnected.
+        """
+        if self.ws_connection is None or self.evicted:
+            raise WebSocketClosedError()
+        if self.pending is not None:
+            self.pending.append((event, key))
+            return
+        message = event.encode(self.format)
+        if not self.outbox and self.buffered < options.client_buffer:
+            self.write_message(message)
+            return
+        stats = self.application.client_stats
+        if key is None:
+            self._seq += 1
+            key = self._seq
+        elif key in self.outbox:
+            del self.outbox[key]
+            stats['coalesced'] += 1
+            if self.format == 'diff':
+                # The replaced diff is lost, send the whole object
+                message = event.encode('compact')
+        self.outbox[key] = message
+        stats['queued'] += 1
+        if len(self.outbox) > options.client_queue:
+            self.evict('queue full')
+            raise WebSocketClosedError()
+        elif self.backlogged is None:
+            self.backlogged = time.time()
+            IOLoop.current().call_later(self.drain_interval, self.drain)
+
+    def drain(self):
+        """Write queued messages as the client catches up."""
+        if self.evicted or self.ws_connection is None:
+            return
+        while self.outbox and self.buffered < options.client_buffer:
+            _, message = self.outbox.popitem(last=False)
+            self.write_message(message)
+        if not self.outbox:
+            self.backlogged = None
+        elif time.time() - self.backlogged > options.client_timeout:
+            self.evict('timeout')
+        else:
+            IOLoop.current().call_later(self.drain_interval, self.drain)
+
+    def evict(self, reason):
+        """Disconnect a client which does not keep up with its messages."""
+        logging.warning('Disconnecting slow client %s (%s).', getattr(self, 'uid', None), reason)
+        self.application.client_stats['evicted'] += 1
+        self.evicted = True
+        self.outbox.clear()
+        self.close(1008, 'Too slow')
+
+    def get_compression_options(self):
+        """Compress messages with permessage-deflate when the client supports it."""
+        return {} if options.deflate else None
+
     def check_origin(self, origin: str):
         allowed = super().check_origin(origin)
         parsed = urlparse(origin.lower())
@@ -68,18 +709,49 @@ class SprintHandler(WebSocketHandler):
         setattr(self, 'sprint', None)
         channel = self.get_argument('channel', None)
         if not channel:
-            self.close()
+            self.close(INVALID_CHANNEL, 'Missing channel')
         else:
             try:  # signature to guarantee the client is not the fake.
-                sprint = self.application.signer.unsign(channel, max_age=60 * 30)
+                sprint = self.application.tokens.unsign(channel, max_age=60 * 30)
                 setattr(self, 'sprint', sprint)
             except (BadSignature, SignatureExpired):
-                self.close()
+                self.close(INVALID_CHANNEL, 'Invalid channel')
             else:
                 uid = uuid.uuid4().hex  # unique uid, Using to send message to others not itself.
                 setattr(self, 'uid', uid)
+                # Clients not asking for the compact format get the JSON objects
+                if self.get_argument('format', None) == 'compact':
+                    diffs = options.diffs and self.get_argument('diffs', None) == '1'
+                    self.format = 'diff' if diffs else 'compact'
+                # Sequence id of the last event the client got before reconnecting
+                since = self.get_argument('since', None)
+                # Confirms the token, clients reset their reconnection backoff on it
+                self.write_message(SUBSCRIBED)
+                if since:
+                    self.pending = []
+                    IOLoop.current().add_callback(self.replay, since)
                 self.application.add_subscriber(getattr(self, 'sprint'), self)
 
+    @gen.coroutine
+    def replay(self, since):
+        """Send the events missed since ``since``, then the live events held meanwhile."""
+        events = yield self.application.get_missed_events(getattr(self, 'sprint'), since)
+        pending, self.pending = self.pending, None
+        try:
+            if events is None:
+                last = None
+                self.send(Event(RESYNC))
+            else:
+                last = parse_seq(events[-1].seq)[1] if events else parse_seq(since)[1]
+                for event in events:
+                    self.send(event)
+            for event, key in pending:
+                # Skip the live events which were also in the buffer
+                if last is None or event.seq is None or parse_seq(event.seq)[1] > last:
+                    self.send(event, key)
+        except WebSocketClosedError:
+            pass
+
     def on_message(self, message: Union[str, bytes]) -> Optional[Awaitable[None]]:
         """Broadcast updates to other interested clients."""
         if getattr(self, 'sprint') is not None:
@@ -103,7 +775,12 @@ class UpdateHandler(RequestHandler):
     def delete(self, model, pk):
         self._broadcast(model, pk, 'remove')
 
-    def _broadcast(self, model, pk, action):
+    def get_key(self, model, pk, action):
+        """Updates carry the full state of the object, the latest one supersedes the others."""
+        return f'{model}/{pk}' if action == 'update' else None
+
+    def _verify(self):
+        """Check the request was signed by the Django application."""
         signature = self.request.headers.get('X-Signature', None)
         if not signature:
             raise HTTPError(400)
@@ -118,6 +795,9 @@ class UpdateHandler(RequestHandler):
             expected = f"{method}:{url}:{body}"
             if not constant_time_compare(result, expected):
                 raise HTTPError(400)
+
+    def _broadcast(self, model, pk, action):
+        self._verify()
         try:
             body = json.loads(self.request.body.decode('utf-8'))
         except ValueError:
@@ -128,60 +808,261 @@ class UpdateHandler(RequestHandler):
             'action': action,
             'body': body,
         })
-        self.application.broadcast(message)
+        for channel in self.application.get_channels(model, pk, body):
+            self.application.broadcast(
+                message, channel=channel, key=self.get_key(model, pk, action), replay=True)
         self.write("OK")
 
 
+class BatchUpdateHandler(UpdateHandler):
+    """Handle a batch of coalesced updates from the Django application."""
+
+    models = ('task', 'sprint', 'user')
+    actions = ('add', 'update', 'remove')
+
+    def put(self):
+        self._verify()
+        try:
+            events = json.loads(self.request.body.decode('utf-8'))
+        except ValueError:
+            raise HTTPError(400)
+        if not isinstance(events, list):
+            raise HTTPError(400)
+        for event in events:
+            try:
+                model, pk, action = event['model'], str(event['id']), event['action']
+            except (TypeError, KeyError):
+                raise HTTPError(400)
+            if model not in self.models or action not in self.actions:
+                raise HTTPError(400)
+            body = event.get('body')
+            message = json.dumps({
+                'model': model,
+                'id': pk,
+                'action': action,
+                'body': body,
+            })
+            for channel in self.application.get_channels(model, pk, body, event.get('sprints')):
+                self.application.broadcast(message, channel=channel,
+                                           key=self.get_key(model, pk, action), replay=True)
+        self.write("OK")
+
+
+class StatsHandler(RequestHandler):
+    """Report per-channel publish and fan-out counters."""
+
+    def get(self):
+        self.write({
+            'pid': os.getpid(),
+            'routing': options.routing,
+            'published': dict(self.application.published),
+            'delivered': dict(self.application.subscriber.delivered),
+            'publisher': self.application.publisher.stats(),
+            'clients': self.application.get_client_stats(),
+            'tokens': self.application.tokens.stats(),
+            # Peak resident memory in KB
+            'memory': resource and resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        })
+
+
 class ScrumApplication(Application):
 
     def __init__(self, **kwargs):
         routes = [
             (r'/socket', SprintHandler),
             (r'/(?P<model>task|sprint|user)/(?P<pk>[0-9]+)', UpdateHandler),
+            (r'/batch', BatchUpdateHandler),
+            (r'/stats', StatsHandler),
         ]
         super().__init__(routes, **kwargs)
-        self.subscriber = RedisSubscriber(Client())
-        self.publisher = Redis()
+        self.backend = backends[options.backend]()
+        self.subscriber = Subscriber(self.backend)
+        self.publisher = Publisher(
+            self.backend, max_queue=options.publish_queue,
+            max_batch=options.publish_batch, backpressure=options.backpressure)
         self._key = os.environ.get('WATERCOOLER_SECRET', ')zu-07tfvq5&@f^k26f&c58w+w$q=r#ttx!j6pku(-lj6d3jtv')
-        self.signer = TimestampSigner(self._key)
+        self.signer = PrecomputedSigner(self._key)
+        self.tokens = TokenCache(self.signer, maxsize=options.token_cache)
+        # Number of messages published, per channel
+        self.published = Counter()
+        # Messages queued and coalesced for slow clients, and clients evicted
+        self.client_stats = Counter()
 
     def add_subscriber(self, channel, subscriber):
-        self.subscriber.subscribe(['all', channel], subscriber)
+        self.subscriber.subscribe('all', subscriber)
+        self.subscriber.subscribe(channel, subscriber)
 
     def remove_subscriber(self, channel, subscriber):
         self.subscriber.unsubscribe(channel, subscriber)
         self.subscriber.unsubscribe('all', subscriber)
 
-    def broadcast(self, message, channel=None, sender=None):
+    def get_clients(self):
+        return {socket for sockets in self.subscriber.channels.values() for socket in sockets}
+
+    def get_client_stats(self):
+        clients = self.get_clients()
+        depths = [len(socket.outbox) for socket in clients]
+        result = dict(self.client_stats)
+        result.update({
+            'connected': len(clients),
+            'backlogged': sum(1 for depth in depths if depth),
+            'depth': sum(depths),
+            'max_depth': max(depths, default=0),
+        })
+        return result
+
+    def get_channels(self, model, pk, body, sprints=None):
+        """
+        Channels interested in a change of a model instance.
+
+        Tasks go to the channels of the sprints they were and are in, sprints
+        to their own channel. Backlog tasks are shown on every sprint board and
+        users are global, so they go to every client.
+        """
+        if options.routing == 'all' or model == 'user':
+            return ['all']
+        if model == 'sprint':
+            return [str(pk)]
+        if sprints is None:
+            # Legacy hooks only carry the current state of the task.
+            sprints = [body.get('sprint') if isinstance(body, dict) else None]
+        if None in sprints:
+            return ['all']
+        return [str(sprint) for sprint in sprints]
+
+    def broadcast(self, message, channel=None, sender=None, key=None, replay=False):
         """
         If channel is None, it means that broadcasting to all clients in every channels.
         otherwise, it broadcasts to these clients who interest in at this channel.
+        Messages with the same key supersede each other while waiting to be published,
+        ``replay`` messages are kept for the clients which missed them.
         """
         channel = 'all' if channel is None else channel
-        message = json.dumps({
-            'sender': sender and sender.uid,
-            'message': message,
-        })
-        self.publisher.publish(channel, message)
+        self.published[channel] += 1
+        self.publisher.publish(channel, message, sender=sender and sender.uid, key=key, replay=replay)
+
+    @gen.coroutine
+    def get_missed_events(self, channel, since):
+        """Events of a sprint board sent after ``since`` in order, None when some are lost."""
+        epoch, number = parse_seq(since)
+        if number is None:
+            return None
+        missed = []
+        for name in (channel, 'all'):
+            entries = yield self.backend.replay(name, epoch, number)
+            if entries is None:
+                return None
+            missed.extend(entries)
+        missed.sort(key=lambda entry: entry[0])
+        return [Event(message, f'{epoch}-{number}') for number, message in missed]
 
 
-def shutdown(server):
+def shutdown(server, application):
     ioloop = IOLoop.instance()
+    if getattr(server, 'stopping', False):
+        return
+    setattr(server, 'stopping', True)
     logging.info('Stopping server.')
     server.stop()
+    # Let clients reconnect to the other workers
+    for client in application.get_clients():
+        client.close(1001, 'Server restarting')
+    deadline = time.time() + options.shutdown_timeout
 
     def finalize():
+        if application.publisher.queue and time.time() < deadline:
+            ioloop.add_timeout(time.time() + 0.1, finalize)
+            return
         ioloop.stop()
         logging.info('Stopped.')
 
     ioloop.add_timeout(time.time() + 1.5, finalize)
 
 
+def bind_reuse_port(port, address=None):
+    """Listening sockets which every worker binds for itself with SO_REUSEPORT."""
+    sockets = []
+    infos = socket.getaddrinfo(address, port, socket.AF_UNSPEC, socket.SOCK_STREAM, 0, socket.AI_PASSIVE)
+    for family, type_, proto, _, sockaddr in sorted(set(infos)):
+        sock = socket.socket(family, type_, proto)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        if family == socket.AF_INET6:
+            sock.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_V6ONLY, 1)
+        sock.setblocking(False)
+        sock.bind(sockaddr)
+        sock.listen(128)
+        sockets.append(sock)
+    return sockets
+
+
+def supervise(processes):
+    """
+    Fork the worker processes and restart those that die.
+
+    Returns the number of the worker in the children. The supervisor forwards
+    SIGTERM and SIGINT to its workers, which drain and exit, and exits once
+    all of them are gone.
+    """
+    children = {}
+    stopping = []
+
+    def start(worker):
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            return True
+        children[pid] = worker
+        return False
+
+    def stop(sig, frame):
+        stopping.append(sig)
+        for pid in children:
+            os.kill(pid, signal.SIGTERM)
+
+    for worker in range(processes):
+        if start(worker):
+            return worker
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    logging.info(f'Started {processes} workers.')
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        worker = children.pop(pid, None)
+        if worker is None or stopping:
+            continue
+        logging.warning(f'Worker {worker} (pid {pid}) exited with status {status}, restarting.')
+        # Do not spin when a worker dies on start
+        time.sleep(1)
+        if start(worker):
+            return worker
+    logging.info('Stopped.')
+    sys.exit(0)
+
+
 if __name__ == "__main__":
     parse_command_line()
+    processes = options.processes or cpu_count()
+    if processes > 1 and options.debug:
+        sys.exit('Debug mode reloads the code, run a single process with --debug.')
+    if processes > 1 and options.backend == 'memory':
+        sys.exit('The memory backend does not reach other processes, run a single process with it.')
+    reuse_port = processes > 1 and options.reuse_port
+    sockets = [] if reuse_port else bind_sockets(options.port)
+    if processes > 1:
+        worker = supervise(processes)
+        logging.info(f'Worker {worker} started with pid {os.getpid()}.')
+    if reuse_port:
+        sockets = bind_reuse_port(options.port)
     application = ScrumApplication(debug=options.debug)
     server = HTTPServer(application)
-    server.listen(options.port)
-    signal.signal(signal.SIGINT, lambda sig, frame: shutdown(server))
+    server.add_sockets(sockets)
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda sig, frame: IOLoop.instance().add_callback_from_signal(
+            shutdown, server, application))
     logging.info(f'Starting server on localhost: {options.port}')
     IOLoop.instance().start()
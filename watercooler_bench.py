@@ -0,0 +1,207 @@
+# coding=utf-8
+
+"""
+Benchmarks of the websocket server.
+
+    python watercooler_bench.py --scenario=open
+    python watercooler_bench.py --scenario=load --clients=1000 --sprints=20
+    python watercooler_bench.py --scenario=load --url=http://localhost:8080
+
+The load scenario starts a server in this process unless ``--url`` is given,
+talking to a local Redis or, with ``--backend=memory``, dispatching in-process.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import random
+import time
+
+from django.core.signing import TimestampSigner
+from tornado import gen
+from tornado.httpclient import AsyncHTTPClient, HTTPRequest
+from tornado.httpserver import HTTPServer
+from tornado.ioloop import IOLoop, PeriodicCallback
+from tornado.netutil import bind_sockets
+from tornado.options import define, parse_command_line, options
+from tornado.websocket import websocket_connect
+
+from watercooler import PrecomputedSigner, ScrumApplication, TokenCache
+
+define('scenario', default='open', type=str, help='Benchmark to run: open or load')
+define('sprints', default=50, type=int, help='Number of sprint channels')
+define('opens', default=100000, type=int, help='Number of websocket opens to verify')
+define('url', default=None, type=str, help='Server to load, starts one in this process by default')
+define('clients', default=500, type=int, help='Number of websockets to open')
+define('rate', default=200, type=int, help='Peer messages sent per second')
+define('hook_rate', default=20, type=int, help='Signed update hooks sent per second')
+define('duration', default=10.0, type=float, help='Seconds to send messages for')
+
+MAX_AGE = 60 * 30
+# Period of the message senders
+TICK = 0.01
+
+
+def get_secret():
+    return os.environ.get('WATERCOOLER_SECRET', ')zu-07tfvq5&@f^k26f&c58w+w$q=r#ttx!j6pku(-lj6d3jtv')
+
+
+def sign_channels(sprints, secret=None):
+    """
+    Channel tokens of the first ``sprints`` sprints.
+
+    Signed with the same key and salt as ``board.links.sign_channel`` but
+    stamped with the current time, not with the start of a refresh period.
+    """
+    signer = TimestampSigner(secret or get_secret())
+    return [signer.sign(str(pk)) for pk in range(1, sprints + 1)]
+
+
+def sign_hook(method, url, body, secret=None):
+    """Hook signature as built by ``board.hooks.build_hook_signature``."""
+    signer = TimestampSigner(secret or get_secret())
+    return signer.sign(f"{method.lower()}:{url}:{hashlib.sha256(body).hexdigest()}")
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0.0
+
+
+def report(name, count, elapsed, baseline=None):
+    rate = count / elapsed
+    speedup = f'{rate / baseline:>8.1f}x' if baseline else ''
+    print(f'{name:<28}{rate:>14,.0f}/s{speedup}')
+    return rate
+
+
+def bench_open():
+    """Verify the channel tokens of a reconnect storm, every client of a sprint sharing its token."""
+    tokens = sign_channels(options.sprints)
+    storm = [tokens[i % len(tokens)] for i in range(options.opens)]
+    print(f'{options.opens} opens across {options.sprints} sprints')
+    cases = [
+        ('TimestampSigner.unsign', TimestampSigner(get_secret()).unsign),
+        ('PrecomputedSigner.unsign', PrecomputedSigner(get_secret()).unsign),
+        ('TokenCache.unsign', TokenCache(PrecomputedSigner(get_secret())).unsign),
+    ]
+    baseline = None
+    for name, unsign in cases:
+        start = time.perf_counter()
+        for token in storm:
+            unsign(token, max_age=MAX_AGE)
+        rate = report(name, len(storm), time.perf_counter() - start, baseline)
+        baseline = baseline or rate
+
+
+def start_server():
+    """Start a server on a free local port, returns its URL."""
+    application = ScrumApplication()
+    sockets = bind_sockets(0, '127.0.0.1')
+    server = HTTPServer(application)
+    server.add_sockets(sockets)
+    return f'http://127.0.0.1:{sockets[0].getsockname()[1]}'
+
+
+class LoadClient(object):
+    """A board client recording the delivery latency of the benchmark messages."""
+
+    def __init__(self, sprint, latencies):
+        self.sprint = sprint
+        self.latencies = latencies
+        self.connection = None
+
+    @gen.coroutine
+    def connect(self, url, token):
+        url = url.replace('http', 'ws', 1) + '/socket?channel=' + token
+        self.connection = yield websocket_connect(url, on_message_callback=self.on_message)
+
+    def send(self, seq):
+        self.connection.write_message(json.dumps({'bench': seq, 'sent': time.time()}))
+
+    def on_message(self, message):
+        if message is None:
+            return
+        data = json.loads(message)
+        if isinstance(data.get('body'), dict):
+            data = data['body']
+        if 'sent' in data:
+            self.latencies.append(time.time() - data['sent'])
+
+
+@gen.coroutine
+def bench_load():
+    """Open websockets on every sprint, send peer messages and hooks, report delivery latency."""
+    url = options.url or start_server()
+    tokens = sign_channels(options.sprints)
+    latencies = []
+    http = AsyncHTTPClient()
+
+    stats = yield http.fetch(url + '/stats')
+    memory_before = json.loads(stats.body.decode('utf-8')).get('memory')
+    start = time.time()
+    clients = [LoadClient(i % options.sprints + 1, latencies) for i in range(options.clients)]
+    yield [client.connect(url, tokens[client.sprint - 1]) for client in clients]
+    opened = time.time() - start
+    print(f'Opened {len(clients)} sockets across {options.sprints} sprints in {opened:.2f}s '
+          f'({len(clients) / opened:,.0f}/s)')
+
+    # Every client of the sprint but the sender receives a peer message
+    per_sprint = options.clients / options.sprints
+    counts = {'sent': 0, 'hooks': 0, 'expected': 0}
+
+    def send_messages():
+        for _ in range(max(1, int(options.rate * TICK))):
+            client = random.choice(clients)
+            client.send(counts['sent'])
+            counts['sent'] += 1
+            counts['expected'] += per_sprint - 1
+
+    @gen.coroutine
+    def send_hook():
+        sprint = random.randint(1, options.sprints)
+        body = json.dumps([{
+            'model': 'task', 'id': str(counts['hooks']), 'action': 'add', 'sprints': [sprint],
+            'body': {'id': counts['hooks'], 'sprint': sprint, 'sent': time.time()},
+        }]).encode('utf-8')
+        counts['hooks'] += 1
+        counts['expected'] += per_sprint
+        hook_url = url + '/batch'
+        headers = {'content-type': 'application/json', 'X-Signature': sign_hook('PUT', hook_url, body)}
+        yield http.fetch(HTTPRequest(hook_url, method='PUT', body=body, headers=headers))
+
+    senders = [PeriodicCallback(send_messages, TICK * 1000)]
+    if options.hook_rate:
+        senders.append(PeriodicCallback(send_hook, 1000 / options.hook_rate))
+    for sender in senders:
+        sender.start()
+    yield gen.sleep(options.duration)
+    for sender in senders:
+        sender.stop()
+    # Let the last messages arrive
+    yield gen.sleep(1)
+
+    stats = yield http.fetch(url + '/stats')
+    stats = json.loads(stats.body.decode('utf-8'))
+    print(f"Sent {counts['sent']} peer messages and {counts['hooks']} hooks in {options.duration:.0f}s")
+    print(f"Delivered {len(latencies)} of {counts['expected']:.0f} expected messages "
+          f"({len(latencies) / options.duration:,.0f}/s)")
+    print(f'Delivery latency p50 {percentile(latencies, 0.5) * 1000:.2f}ms '
+          f'p99 {percentile(latencies, 0.99) * 1000:.2f}ms max {max(latencies, default=0) * 1000:.2f}ms')
+    if stats.get('memory'):
+        print(f"Server memory {stats['memory'] / 1024:.1f}MB (was {memory_before / 1024:.1f}MB)")
+    for client in clients:
+        client.connection.close()
+
+
+scenarios = {
+    'open': bench_open,
+    'load': lambda: IOLoop.current().run_sync(bench_load),
+}
+
+
+if __name__ == '__main__':
+    parse_command_line()
+    logging.getLogger('tornado.access').setLevel(logging.WARNING)
+    scenarios[options.scenario]()